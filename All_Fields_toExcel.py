@@ -7,6 +7,14 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 import time
+import os
+import re
+import numbers
+import datetime
+from urllib.parse import urlparse
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
 
 # Path to your ChromeDriver executable
 chromedriver_path = r'C:\Users\charisis\Downloads\chromedriver-win64\chromedriver-win64\chromedriver.exe'
@@ -149,10 +157,96 @@ def extract_product_info(url, base_url, config):
 
     return products
 
-def export_data_to_excel(data, file_name):
-    # Function to export data to an Excel file.
-    data.to_excel(file_name, index=False)
-    print(f"Data has been exported to the file '{file_name}'")
+# Columns that are exported when no columns are given. The "HTML" and "Content HTML" columns are left out:
+# they are the biggest part of the data and they are of no use inside a spreadsheet.
+default_export_columns = ["Description", "URL", "Price", "Image Info", "Source", "Title", "Availability", "Product Code", "Brand"]
+
+# Excel can not hold more characters than this in one cell.
+excel_cell_limit = 32767
+
+def sheet_name_for(source, used_names):
+    # Every shop gets its own sheet, named after the host of its "Source" url (at most 31 characters, without []:*?/\).
+    name = urlparse(str(source)).netloc or str(source) or "products"
+    name = re.sub(r"[\[\]:*?/\\]", "_", name[4:] if name.startswith("www.") else name)[:31]
+    return used_names.setdefault(source, name)
+
+def prepare_cell(value, oversized, offload_directory, sheet_name, row_number, column):
+    # Function to make a value fit in an Excel cell.
+    # Empty values stay empty and characters that are not allowed in the xlsx format are removed.
+    if value is None or (isinstance(value, float) and value != value):
+        return None, None
+    # Numbers and dates are written as they are. Anything else, for example the BeautifulSoup object of a
+    # product page in "Content HTML", is written as its text and goes through the checks below like any other text.
+    if isinstance(value, (numbers.Number, datetime.date, datetime.time)):
+        return value, None
+    value = ILLEGAL_CHARACTERS_RE.sub("", str(value))
+    if len(value) <= excel_cell_limit:
+        return value, None
+    if oversized == "offload":
+        # The whole text goes to a file next to the workbook and the cell links to it.
+        os.makedirs(offload_directory, exist_ok=True)
+        path = os.path.join(offload_directory, f"{sheet_name}-{row_number}-{column.replace(' ', '_')}.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(value)
+        return f"{len(value)} characters, see {path}", os.path.relpath(path, os.path.dirname(offload_directory))
+    # "truncate": keep as much as fits.
+    return value[:excel_cell_limit], None
+
+def export_data_to_excel(data, file_name, columns=None, oversized="truncate", streaming=True):
+    # Function to export data to an Excel file, with one sheet per shop.
+    # "data" is a DataFrame or any iterable of product dictionaries (for example rows that are still being produced).
+    # "columns" are the columns to export, by default the ones without HTML.
+    # "oversized" is what happens to a text longer than an Excel cell: "truncate" cuts it, "offload" writes it to a
+    # file in the <file_name>_cells folder and the cell gets a link to that file.
+    # With "streaming" the rows are written one by one with the write-only mode of openpyxl, so the workbook is never
+    # built in memory. Without it the rows of every shop are collected into a DataFrame and written with pandas.
+    columns = columns or default_export_columns
+    if isinstance(data, pd.DataFrame):
+        names = list(dict.fromkeys(columns + ["Source"]))
+        data = (dict(zip(names, row)) for row in data.reindex(columns=names).itertuples(index=False, name=None))
+    offload_directory = os.path.splitext(file_name)[0] + "_cells"
+    sheet_names = {}
+    row_numbers = {}
+    rows_written = 0
+
+    if streaming:
+        workbook = Workbook(write_only=True)
+        sheets = {}
+    else:
+        frames = {}
+
+    for product in data:
+        sheet_name = sheet_name_for(product.get("Source"), sheet_names)
+        row_number = row_numbers[sheet_name] = row_numbers.get(sheet_name, 1) + 1
+        cells = [prepare_cell(product.get(column), oversized, offload_directory, sheet_name, row_number, column) for column in columns]
+        if streaming:
+            if sheet_name not in sheets:
+                sheets[sheet_name] = workbook.create_sheet(sheet_name)
+                sheets[sheet_name].append(columns)
+            sheet = sheets[sheet_name]
+            row = []
+            for value, link in cells:
+                if link is None:
+                    row.append(value)
+                else:
+                    cell = WriteOnlyCell(sheet, value=value)
+                    cell.hyperlink = link
+                    cell.style = "Hyperlink"
+                    row.append(cell)
+            sheet.append(row)
+        else:
+            frames.setdefault(sheet_name, []).append([value for value, _ in cells])
+        rows_written += 1
+
+    if streaming:
+        if not sheets:
+            workbook.create_sheet("products").append(columns)
+        workbook.save(file_name)
+    else:
+        with pd.ExcelWriter(file_name) as writer:
+            for sheet_name, rows in (frames or {"products": []}).items():
+                pd.DataFrame(rows, columns=columns).to_excel(writer, sheet_name=sheet_name, index=False)
+    print(f"{rows_written} rows have been exported to the file '{file_name}' ({len(row_numbers) or 1} sheets)")
 
 if __name__ == "__main__":
     # Configuration for the first website (e-dructer)
@@ -1,411 +1,2656 @@
 # Importing libraries
 # Look "readme" for details
 import requests
-from bs4 import BeautifulSoup 
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from bs4 import BeautifulSoup, UnicodeDammit
+import soupsieve
 import pandas as pd 
 from selenium import webdriver 
 from selenium.webdriver.chrome.service import Service 
 from selenium.webdriver.common.by import By 
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC 
+from selenium.common.exceptions import TimeoutException, WebDriverException
 import time 
+import os
+import json
+import hashlib
+import struct
+import zlib
+import atexit
+import base64
+import bisect
+import glob
+import gzip
+import uuid
+import threading
+import itertools
+import queue
+import re
+import sqlite3
+import tempfile
+import unicodedata
+from collections import deque
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from urllib.parse import urlparse, urlsplit, urlunsplit, urljoin, parse_qsl, urlencode
 import mysql.connector 
+import mysql.connector.pooling
 from mysql.connector import Error
 
 # Path to ChromeDriver.
 chromedriver_path = r'C:\Users\Γιωργος\Downloads\chromedriver-win64\chromedriver-win64\chromedriver.exe'
 
-# Get the product description from the web page using selenium.
-# Selenium was needed to recognize the tag of product description for cookshop.
-def fetch_product_description_with_selenium(url, description_selector):
+# Settings of the pool of warm browsers that renders the cookshop product pages.
+selenium_pool_size = 3 # How many chrome instances are kept open at the same time.
+selenium_pages_per_driver = 50 # A browser is restarted after rendering that many pages, to keep its memory usage low.
+selenium_wait_timeout = 10 # How many seconds we wait for the description tag to appear.
+
+# The browser profile.
+# "default" is plain headless chrome: it downloads every image, stylesheet, font and tracker and waits for the full load event.
+# "lean" only keeps what we need to get the DOM: pages are loaded with the "eager" strategy (we get control back at DOMContentLoaded,
+# the description is waited for with WebDriverWait anyway), extensions and the GPU are disabled, and the requests for
+# the resources below are blocked through the DevTools protocol.
+selenium_profile = "lean"
+blocked_resource_patterns = [
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.avif", "*.svg", "*.ico",
+    "*.css", "*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot",
+    "*.mp4", "*.webm",
+    "*google-analytics.com*", "*googletagmanager.com*", "*doubleclick.net*", "*facebook.net*", "*hotjar.com*"
+]
+
+# Start a new headless chrome instance.
+def create_driver(profile=None):
+    profile = profile or selenium_profile
     # Initialization
     service = Service(chromedriver_path) 
     options = webdriver.ChromeOptions()
     options.add_argument("--headless") #run chrome in headless mode
+    if profile == "lean":
+        options.page_load_strategy = 'eager'
+        options.add_argument("--disable-extensions")
+        options.add_argument("--disable-gpu")
+        options.add_argument("--blink-settings=imagesEnabled=false")
     driver = webdriver.Chrome(service=service, options=options)
-    
+    if profile == "lean":
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": blocked_resource_patterns})
+    return driver
+
+# A pool of long-lived browsers. A driver is checked out for a single url and then given back,
+# so chrome is started once per driver instead of once per product.
+# A driver is thrown away (and replaced on demand) when it crashes or after it has rendered "pages_per_driver" pages.
+class DriverPool:
+    def __init__(self, size=selenium_pool_size, pages_per_driver=selenium_pages_per_driver):
+        self.size = size
+        self.pages_per_driver = pages_per_driver
+        self.idle = [] # (driver, pages rendered) pairs that are ready to be used
+        self.started = 0 # drivers that are currently alive, idle or checked out
+        self.available = threading.Condition()
+
+    def checkout(self):
+        with self.available:
+            # If every driver is busy we wait until one is given back or thrown away.
+            while not self.idle and self.started >= self.size:
+                self.available.wait()
+            if self.idle:
+                return self.idle.pop()
+            self.started += 1
+        try:
+            return create_driver(), 0
+        except Exception:
+            self.release_slot()
+            raise
+
+    def give_back(self, driver, pages):
+        if pages >= self.pages_per_driver:
+            self.discard(driver)
+        else:
+            with self.available:
+                self.idle.append((driver, pages))
+                self.available.notify()
+
+    def release_slot(self):
+        with self.available:
+            self.started -= 1
+            self.available.notify()
+
+    def discard(self, driver):
+        self.release_slot()
+        try:
+            driver.quit() #End instance
+        except Exception:
+            pass # a browser that crashed can also fail to quit
+
+    @contextmanager
+    def driver(self):
+        driver, pages = self.checkout()
+        crashed = False
+        try:
+            yield driver
+        except TimeoutException:
+            # The page was slow, but the browser itself is fine.
+            raise
+        except Exception:
+            # The browser crashed or stopped responding, so we do not reuse it. When chromedriver or Chrome dies
+            # selenium often raises the urllib3 or connection error of the lost connection instead of a WebDriverException.
+            crashed = True
+            raise
+        finally:
+            if crashed:
+                self.discard(driver)
+            else:
+                self.give_back(driver, pages + 1)
+
+    def close(self):
+        with self.available:
+            idle, self.idle = self.idle, []
+        for driver, _ in idle:
+            self.discard(driver)
+
+# The pool is shared by every cookshop config and is started the first time it is needed.
+driver_pool = None
+driver_pool_lock = threading.Lock()
+
+def get_driver_pool():
+    global driver_pool
+    with driver_pool_lock:
+        if driver_pool is None:
+            driver_pool = DriverPool()
+            atexit.register(close_driver_pool)
+        return driver_pool
+
+def close_driver_pool():
+    global driver_pool
+    with driver_pool_lock:
+        if driver_pool is not None:
+            driver_pool.close()
+            driver_pool = None
+
+# Load the url in an already running browser and get the page source once the description is there.
+def render_product_page(driver, url, description_selector):
     driver.get(url) #"hit" the URL
+    # Wait for the description tag to be found
+    WebDriverWait(driver, selenium_wait_timeout).until(
+        EC.presence_of_element_located((By.CSS_SELECTOR, description_selector))
+    )
+    return driver.page_source
+
+# Get the page source of a product page using selenium.
+# When a pool is given the page is rendered by one of its warm browsers, otherwise a new browser is started just for this url.
+# With archive_mode "record" the rendered DOM is also written to the WARC archive, and with "replay" it is read from there instead.
+def fetch_product_page_with_selenium(url, description_selector, pool=None):
+    if archive_mode == 'replay':
+        page_source = get_warc_archive().rendered_page(url)
+        if page_source is None:
+            raise WebDriverException(f"{url} was not rendered in the archived crawl")
+        return page_source
+
+    if pool is not None:
+        with pool.driver() as driver:
+            page_source = render_product_page(driver, url, description_selector)
+    else:
+        driver = create_driver()
+        try:
+            page_source = render_product_page(driver, url, description_selector)
+        finally:
+            driver.quit() #End instance
+
+    if archive_mode == 'record':
+        get_warc_writer().write_rendered_page(url, page_source)
+    return page_source
+
+# Instrumentation of the crawl.
+# The stages of the hot path are timed: the PLP and PDP requests ("plp_fetch", "pdp_fetch"), the selenium renders ("render"),
+# every parse ("parse"), the selector extraction ("extract") and the MySQL batches ("db_write").
+# For every (stage, site) we keep a latency histogram, the bytes that went through and the number of errors,
+# so after a slow run we can tell whether the time went to the network, the parsing or the database.
+# At the end of a run they are printed and written as JSON lines and as a Prometheus text file. Set a path to None to turn that file off.
+metrics_jsonl_path = 'crawl_metrics.jsonl' # every run appends one line per (stage, site)
+metrics_prometheus_path = 'crawl_metrics.prom' # rewritten every run, it can be picked up by the textfile collector of node_exporter
+latency_buckets = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30] # upper bounds of the histogram buckets, in seconds
+
+metrics = {}
+metrics_lock = threading.Lock()
+
+def new_metric():
+    return {"count": 0, "seconds": 0.0, "buckets": [0] * (len(latency_buckets) + 1), "bytes": 0, "errors": 0}
+
+# Add one measurement to the metrics of (stage, site).
+def record_metric(stage, site, seconds, size=0, error=False):
+    bucket = bisect.bisect_left(latency_buckets, seconds)
+    with metrics_lock:
+        metric = metrics.setdefault((stage, site), new_metric())
+        metric["count"] += 1
+        metric["seconds"] += seconds
+        metric["buckets"][bucket] += 1
+        metric["bytes"] += size
+        metric["errors"] += int(error)
+
+# Time the code of a "with" block as one measurement of (stage, site).
+# The block can set measurement["bytes"] and measurement["error"]. An exception counts as an error and is raised again.
+@contextmanager
+def measure(stage, site):
+    measurement = {"bytes": 0, "error": False}
+    start = time.perf_counter()
     try:
-        # Wait for the description tag to be found
-        WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located((By.CSS_SELECTOR, description_selector))
+        yield measurement
+    except Exception:
+        measurement["error"] = True
+        raise
+    finally:
+        record_metric(stage, site, time.perf_counter() - start, measurement["bytes"], measurement["error"])
+
+# A copy of the metrics, for example to send them from a worker process to the main process.
+def metrics_snapshot():
+    with metrics_lock:
+        return {key: dict(metric, buckets=list(metric["buckets"])) for key, metric in metrics.items()}
+
+# Add the metrics of another process to ours.
+def merge_metrics(snapshot):
+    with metrics_lock:
+        for key, other in snapshot.items():
+            metric = metrics.setdefault(key, new_metric())
+            for name in ("count", "seconds", "bytes", "errors"):
+                metric[name] += other[name]
+            metric["buckets"] = [ours + theirs for ours, theirs in zip(metric["buckets"], other["buckets"])]
+
+# Percentile estimated from the histogram: the upper bound of the bucket it falls in.
+def metric_percentile(metric, fraction):
+    seen = 0
+    for bound, count in zip(latency_buckets + [float('inf')], metric["buckets"]):
+        seen += count
+        if seen >= metric["count"] * fraction:
+            return bound
+    return float('inf')
+
+def print_metrics():
+    print(f"{'stage':<10} {'site':<24} {'count':>6} {'mean ms':>9} {'p50 ms':>8} {'p95 ms':>8} {'MB':>8} {'errors':>6}")
+    for (stage, site), metric in sorted(metrics_snapshot().items()):
+        mean = metric["seconds"] / metric["count"] * 1000 if metric["count"] else 0
+        print(
+            f"{stage:<10} {site:<24} {metric['count']:>6} {mean:>9.1f} {metric_percentile(metric, 0.5) * 1000:>8.0f} "
+            f"{metric_percentile(metric, 0.95) * 1000:>8.0f} {metric['bytes'] / 1e6:>8.2f} {metric['errors']:>6}"
         )
-        soup = BeautifulSoup(driver.page_source, 'html.parser') #Parse the page
-        description_tag = soup.select_one(description_selector) #Set the description tag
-        # Extraction of description and debug
-        if description_tag: 
-            description_parts = description_tag.find_all('p')
-            description = " ".join([part.get_text(strip=True) for part in description_parts])
-            return description, str(soup)
+
+def bucket_labels():
+    return [str(bound) for bound in latency_buckets] + ["+Inf"]
+
+def write_metrics_jsonl(path):
+    timestamp = time.strftime('%Y-%m-%dT%H:%M:%S')
+    with open(path, 'a', encoding='utf-8') as f:
+        for (stage, site), metric in sorted(metrics_snapshot().items()):
+            f.write(json.dumps({
+                "time": timestamp,
+                "stage": stage,
+                "site": site,
+                "count": metric["count"],
+                "seconds": round(metric["seconds"], 6),
+                "bytes": metric["bytes"],
+                "errors": metric["errors"],
+                "buckets": dict(zip(bucket_labels(), metric["buckets"]))
+            }, ensure_ascii=False) + "\n")
+
+def write_metrics_prometheus(path):
+    snapshot = sorted(metrics_snapshot().items())
+    lines = ["# HELP scraper_stage_seconds Time spent in a stage of the crawl.", "# TYPE scraper_stage_seconds histogram"]
+    for (stage, site), metric in snapshot:
+        labels = f'stage="{stage}",site="{site}"'
+        cumulative = 0
+        for bound, count in zip(bucket_labels(), metric["buckets"]):
+            cumulative += count
+            lines.append(f'scraper_stage_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f'scraper_stage_seconds_sum{{{labels}}} {metric["seconds"]:.6f}')
+        lines.append(f'scraper_stage_seconds_count{{{labels}}} {metric["count"]}')
+    for name, key, help_text in (("scraper_stage_bytes_total", "bytes", "Bytes downloaded, parsed or written in a stage."),
+                                 ("scraper_stage_errors_total", "errors", "Failed operations of a stage.")):
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+        for (stage, site), metric in snapshot:
+            lines.append(f'{name}{{stage="{stage}",site="{site}"}} {metric[key]}')
+    # The file is replaced in one step, so the collector never reads half of it.
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        f.write("\n".join(lines) + "\n")
+    os.replace(path + '.tmp', path)
+
+def export_metrics():
+    if metrics_jsonl_path:
+        write_metrics_jsonl(metrics_jsonl_path)
+    if metrics_prometheus_path:
+        write_metrics_prometheus(metrics_prometheus_path)
+
+# HTML parsers that can be selected with the "parser" key of a site config.
+# Every parser offers the same few operations, so the extraction code does not depend on the library behind it.
+# "html.parser" is the pure python parser that the project always used. "lxml" is the same BeautifulSoup API on top of a C parser
+# and "selectolax" is a C parser with its own (much lighter) tree. lxml and selectolax have to be installed separately:
+# pip install lxml
+# pip install selectolax
+# select and select_one take a selector string or a selector made by compile (see SelectorPlan below).
+default_html_parser = 'html.parser'
+
+class SoupParser:
+    def __init__(self, features):
+        self.features = features
+
+    def parse(self, html):
+        return BeautifulSoup(html, self.features)
+
+    def compile(self, selector):
+        return soupsieve.compile(selector)
+
+    def select(self, node, selector):
+        if isinstance(selector, str):
+            return node.select(selector)
+        return selector.select(node)
+
+    def select_one(self, node, selector):
+        if isinstance(selector, str):
+            return node.select_one(selector)
+        return selector.select_one(node)
+
+    def text(self, node):
+        return node.text
+
+    def attribute(self, node, name):
+        return node.get(name)
+
+    def html(self, node):
+        return str(node)
+
+    def paragraphs(self, node):
+        return [part.get_text(strip=True) for part in node.find_all('p')]
+
+class SelectolaxParser:
+    def __init__(self):
+        from selectolax.lexbor import LexborHTMLParser
+        self.parser_class = LexborHTMLParser
+
+    def parse(self, html):
+        return self.parser_class(html)
+
+    # selectolax has no compiled selectors, lexbor parses the string at every call (which is cheap in C).
+    def compile(self, selector):
+        return selector
+
+    def select(self, node, selector):
+        return node.css(selector)
+
+    def select_one(self, node, selector):
+        return node.css_first(selector)
+
+    def text(self, node):
+        return node.text(deep=True)
+
+    def attribute(self, node, name):
+        return node.attributes.get(name)
+
+    def html(self, node):
+        return node.html
+
+    def paragraphs(self, node):
+        return [part.text(deep=True, strip=True) for part in node.css('p')]
+
+html_parser_factories = {
+    "html.parser": lambda: SoupParser('html.parser'),
+    "lxml": lambda: SoupParser('lxml'),
+    "selectolax": SelectolaxParser
+}
+html_parsers = {}
+
+# Get the parser that a site config asks for. Parsers are created once and then reused.
+def get_html_parser(config=None):
+    name = (config or {}).get('parser', default_html_parser)
+    if name not in html_parsers:
+        if name not in html_parser_factories:
+            raise ValueError(f"Unknown HTML parser '{name}', choose one of {', '.join(html_parser_factories)}")
+        html_parsers[name] = html_parser_factories[name]()
+    return html_parsers[name]
+
+# Turn the bytes of a response into text. The encoding is detected the same way BeautifulSoup does it.
+def decode_html(page_html):
+    if isinstance(page_html, bytes):
+        return UnicodeDammit(page_html, is_html=True).unicode_markup
+    return page_html
+
+# The value we store when a field can not be found in the product page.
+missing_field_values = {
+    "title": 'No title',
+    "description": 'No description',
+    "availability": 'No availability info',
+    "product_code": 'No product code',
+    "brand": 'No brand'
+}
+
+# Join the text of the paragraphs of a tag. This is how the cookshop description is built.
+def extract_paragraphs(tag, missing_value, parser=None):
+    parser = parser or get_html_parser()
+    # Extraction of description and debug
+    if tag is not None: 
+        return " ".join(parser.paragraphs(tag))
+    else:
+        return missing_value
+
+# Get the stripped text of the first tag that matches the selector, or the missing value.
+# This is the select_one(...).text.strip() logic that is used for almost every field.
+def extract_text(parser, node, selector, missing_value):
+    tag = parser.select_one(node, selector)
+    return parser.text(tag).strip() if tag is not None else missing_value
+
+# Selector plans.
+# Every product runs the same selectors of its site config, and soupsieve would parse the CSS string again at every call
+# (for example the long style attribute selectors of the availability in e-druster and cosmomarket).
+# A plan compiles the selectors of a config once for a parser and keeps an extractor function for every field of the
+# product page. The plans are cached per process: the ones of site_jobs are made when the module is loaded, so worker
+# processes have them ready, forked or spawned (an unpickled copy of a config finds the plan of the equal config).
+class SelectorPlan:
+    def __init__(self, config, parser):
+        self.parser = parser
+        self.site = config['site']
+        self.product_list = parser.compile(config['product_list'])
+        self.description = parser.compile(config['description'])
+        self.price = parser.compile(config['price'])
+        self.image = parser.compile(config['image'])
+        # The link of a product is the "a.wrap" of its block in cookshop and the link in the description in the other shops.
+        self.link = parser.compile('a.wrap' if self.site == 'cookshop' else 'a')
+        # Cookshop shows the brand only in the product page, so it is taken from there.
+        self.brand = parser.compile(config['brand']) if self.site != 'cookshop' and 'brand' in config else None
+
+        self.product_page = {}
+        for field, selector in config.get('product_page', {}).items():
+            if field == 'description' and self.site == 'cookshop':
+                self.product_page[field] = self.paragraphs_extractor(selector, "No description found")
+            else:
+                self.product_page[field] = self.text_extractor(selector, missing_field_values.get(field, 'No ' + field))
+        if self.site == 'cookshop' and 'brand' in config:
+            self.product_page['brand'] = self.text_extractor(config['brand'], missing_field_values['brand'])
+
+    def text_extractor(self, selector, missing_value):
+        selector = self.parser.compile(selector)
+        return lambda page: extract_text(self.parser, page, selector, missing_value)
+
+    def paragraphs_extractor(self, selector, missing_value):
+        selector = self.parser.compile(selector)
+        return lambda page: extract_paragraphs(self.parser.select_one(page, selector), missing_value, self.parser)
+
+    # Run every "product_page" selector against the parsed product page.
+    def product_page_fields(self, page):
+        return {field: extract(page) for field, extract in self.product_page.items()}
+
+selector_plans = {}
+selector_plans_by_id = {}
+
+# Get the plan of a site config for a parser. A config is looked up by its id first, which is what every product does,
+# and then by its content. Configs are not changed once a crawl has started.
+def get_selector_plan(config, parser=None):
+    parser = parser or get_html_parser(config)
+    cached = selector_plans_by_id.get((id(config), id(parser)))
+    if cached is not None and cached[0] is config:
+        return cached[1]
+    key = (id(parser), json.dumps(config, sort_keys=True, default=str))
+    if key not in selector_plans:
+        selector_plans[key] = SelectorPlan(config, parser)
+    selector_plans_by_id[(id(config), id(parser))] = (config, selector_plans[key])
+    return selector_plans[key]
+
+# Decode and parse a downloaded page, as one "parse" measurement.
+def parse_page(parser, content, site):
+    with measure('parse', site) as measurement:
+        measurement["bytes"] = len(content)
+        return parser.parse(decode_html(content))
+
+# Parse a product page once and run every "product_page" selector of the config against the same tree.
+# "page_html" can be the bytes of a response or the page source from selenium.
+# Returns the fields and the raw HTML of the page as a string.
+def extract_product_page_fields(page_html, config):
+    parser = get_html_parser(config)
+    with measure('parse', config['site']) as measurement:
+        measurement["bytes"] = len(page_html)
+        page_html = decode_html(page_html)
+        page = parser.parse(page_html) # This is the only time the product page is parsed.
+
+    with measure('extract', config['site']):
+        # Cookshop shows the brand in the product page, so its plan also has a "brand" field. The rest of the shops show it in the PLP.
+        fields = get_selector_plan(config, parser).product_page_fields(page)
+
+    return fields, page_html
+
+# Get the fields of a product from its block in the PLP.
+# The keys are the names of the columns of the final table.
+def extract_listing_fields(product, base_url, config, parser):
+    plan = get_selector_plan(config, parser)
+    description_tag = parser.select_one(product, plan.description)
+    description = parser.text(description_tag).strip() if description_tag is not None else 'No description'
+
+    # Given the different structure of the selected webpages we were forced to take into account many cases.
+    # This issue is very vibrant in the case of the coockshop web page
+
+    # Here we get the link tag
+    if config['site'] == 'cookshop':
+        link_tag = parser.select_one(product, plan.link)
+    elif description_tag is not None:
+        link_tag = parser.select_one(description_tag, plan.link)
+    else:
+        link_tag = None
+
+    # Here we construct the link tag. Again many cases were taken into account to fix all the possible issues.
+    relative_link = (parser.attribute(link_tag, 'href') or '') if link_tag is not None else ''
+    if relative_link.startswith('/'):
+        full_link = base_url + relative_link
+    elif relative_link.startswith('http'):
+        full_link = relative_link
+    elif relative_link:
+        full_link = base_url + '/' + relative_link
+    else:
+        full_link = base_url
+
+    # Price extraction
+    price = extract_text(parser, product, plan.price, 'No price')
+
+    # Image extraction
+    image_tag = parser.select_one(product, plan.image)
+    if image_tag is not None:
+        image_info = parser.attribute(image_tag, 'src') or ''
+        if image_info.startswith('//'):
+            image_info = 'https:' + image_info
+        elif image_info.startswith('/'):
+            image_info = base_url + image_info
+    else:
+        image_info = 'No image found'
+
+    # Cookshop shows the brand only in the product page, so it is taken from there.
+    # Here we took into account cases where the information about brand is optional or/and not provided
+    if plan.brand is not None:
+        brand = extract_text(parser, product, plan.brand, 'No brand')
+    else:
+        brand = 'No brand'
+
+    return {
+        "HTML": parser.html(product),
+        "Description": description,
+        "URL": full_link,
+        "Price": price,
+        "Image Info": image_info,
+        "Brand": brand,
+        "Listing Hash": listing_hash(parser.html(product), price)
+    }
+
+# Fingerprint of a product in the PLP. If the snippet and the price are byte-identical to the last run,
+# the product has not changed and its product page does not need to be fetched again.
+# The snippet is serialized by the parser of the config, and every parser writes markup a little differently. Changing the
+# "parser" of a site therefore changes the hash of every one of its products: the next incremental run fetches the whole shop once.
+def listing_hash(html_content, price):
+    return hashlib.sha256(f"{html_content}\n{price}".encode('utf-8')).hexdigest()
+
+# Run "function" over the items on a pool of threads and yield the results in the same order as the items.
+# At most max_workers * 2 results are waiting to be consumed, so a slow consumer (for example the database writer)
+# does not make us keep every page of a category in memory.
+def iter_concurrently(function, items, max_workers):
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = deque()
+        for item in items:
+            pending.append(executor.submit(function, item))
+            if len(pending) >= max_workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+# How many pages we download at the same time from a single shop.
+# A shop can override it with the "max_concurrency" key of its config dictionary.
+default_max_concurrency = 8
+
+# One semaphore per host, so that every thread hitting the same shop shares the same limit.
+host_limits = {}
+host_limits_lock = threading.Lock()
+
+def get_host_limit(url, max_concurrency):
+    host = urlparse(url).netloc
+    with host_limits_lock:
+        if host not in host_limits:
+            host_limits[host] = threading.BoundedSemaphore(max_concurrency)
+        return host_limits[host]
+
+# Shared HTTP sessions.
+# Every host gets one requests.Session that is used by all the threads, with a pool of keep-alive connections
+# (so a product page does not cost a new TCP + TLS handshake) and a token bucket that limits the requests per second.
+# A shop can set "requests_per_second" and "burst" in its config dictionary.
+default_requests_per_second = 5
+default_burst = 10
+
+# Compressed responses are smaller and faster to download. Brotli is only asked for if it can be decoded (pip install brotli).
+try:
+    import brotli
+    accept_encoding = "gzip, deflate, br"
+except ImportError:
+    accept_encoding = "gzip, deflate"
+
+# Allows "rate" requests per second on average, and up to "capacity" requests at once after a quiet period.
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+# Number of TCP connections that were opened to every (host, port). A request that did not open one reused a kept-alive connection.
+connections_opened = {}
+connections_opened_lock = threading.Lock()
+
+def count_connection(host):
+    with connections_opened_lock:
+        connections_opened[host] = connections_opened.get(host, 0) + 1
+
+class CountedHTTPConnection(HTTPConnection):
+    def connect(self):
+        count_connection((self.host, self.port))
+        super().connect()
+
+class CountedHTTPSConnection(HTTPSConnection):
+    def connect(self):
+        count_connection((self.host, self.port))
+        super().connect()
+
+class CountedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = CountedHTTPConnection
+
+class CountedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = CountedHTTPSConnection
+
+# A requests adapter whose connection pools count the connections they open.
+class CountingHTTPAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {"http": CountedHTTPConnectionPool, "https": CountedHTTPSConnectionPool}
+
+class HostSession:
+    def __init__(self, host, max_concurrency, requests_per_second, burst):
+        self.host = host
+        self.requests_made = 0
+        self.session = requests.Session()
+        self.adapter = CountingHTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency)
+        self.session.mount('http://', self.adapter)
+        self.session.mount('https://', self.adapter)
+        self.session.headers['Accept-Encoding'] = accept_encoding
+        self.bucket = TokenBucket(requests_per_second, burst)
+
+    def connection_stats(self):
+        opened = connections_opened.get(self.host, 0)
+        return {"requests": self.requests_made, "connections opened": opened, "connections reused": max(self.requests_made - opened, 0)}
+
+# The settings of every host are registered from its site config when a crawl starts (see configure_host).
+host_settings = {}
+host_sessions = {}
+host_sessions_lock = threading.Lock()
+
+def configure_host(url, config):
+    host_settings[urlparse(url).netloc] = config
+
+def get_host_session(url):
+    host = urlparse(url).netloc
+    with host_sessions_lock:
+        if host not in host_sessions:
+            config = host_settings.get(host, {})
+            parts = urlparse(url)
+            host_sessions[host] = HostSession(
+                (parts.hostname, parts.port or (443 if parts.scheme == 'https' else 80)),
+                config.get('max_concurrency', default_max_concurrency),
+                config.get('requests_per_second', default_requests_per_second),
+                config.get('burst', default_burst)
+            )
+        return host_sessions[host]
+
+# Every fetch of the scraper goes through here: wait for the rate limit of the host, then send the request on its session.
+def http_get(url, headers=None, timeout=30):
+    host_session = get_host_session(url)
+    host_session.bucket.acquire()
+    with host_sessions_lock:
+        host_session.requests_made += 1
+    return host_session.session.get(url, headers=headers, timeout=timeout)
+
+def print_connection_stats():
+    with host_sessions_lock:
+        for host, host_session in host_sessions.items():
+            print(f"{host}: {host_session.connection_stats()}")
+
+# Settings of the on-disk HTTP cache for the PLP and PDP requests. Set the directory to None to turn the cache off.
+# A cached page is not trusted blindly: it is revalidated with a conditional request (If-None-Match / If-Modified-Since)
+# and only a "304 Not Modified" answer makes us use the stored body, so most unchanged pages cost a small request instead of a full download.
+http_cache_directory = 'http_cache'
+http_cache_max_bytes = 500 * 1024 * 1024 # When the cache gets bigger, the least recently used pages are removed.
+
+# Query parameters that do not change the page (tracking ids etc.) and are left out of the cache key.
+tracking_parameters = {'fbclid', 'gclid', 'msclkid'}
+
+# The same page can be reached with different urls (case of the host, order of the parameters, tracking ids).
+# They all get the same canonical url, which is what the cache is keyed by.
+def canonical_url(url):
+    parts = urlsplit(url)
+    query = sorted(
+        (name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True)
+        if name not in tracking_parameters and not name.startswith('utm_')
+    )
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path or '/', urlencode(query), ''))
+
+# What fetch_page returns when the page came from the cache. It has the attributes of a requests response that the scraper uses.
+class CachedResponse:
+    def __init__(self, url, content, headers):
+        self.url = url
+        self.status_code = 200
+        self.content = content
+        self.headers = headers
+        self.from_cache = True
+
+# Every page is kept in two files named after the hash of its canonical url: the body and a small json file with
+# the validators (ETag, Last-Modified), the content type, the size and when it was last used.
+class HttpCache:
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.total_bytes = None # Computed the first time it is needed.
+        self.stats = {"revalidated": 0, "downloaded": 0, "stored": 0, "evicted": 0}
+
+    def paths(self, url):
+        key = hashlib.sha256(canonical_url(url).encode('utf-8')).hexdigest()
+        folder = os.path.join(self.directory, key[:2])
+        return os.path.join(folder, key + '.body'), os.path.join(folder, key + '.json')
+
+    def lookup(self, url):
+        body_path, meta_path = self.paths(url)
+        try:
+            with open(meta_path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def read_body(self, url):
+        body_path, meta_path = self.paths(url)
+        with open(body_path, 'rb') as f:
+            return f.read()
+
+    def write_file(self, path, data):
+        # Write to a temporary file first, so a crash never leaves half a file behind.
+        temporary_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(temporary_path, 'wb') as f:
+            f.write(data)
+        os.replace(temporary_path, path)
+
+    def write_meta(self, url, meta):
+        body_path, meta_path = self.paths(url)
+        self.write_file(meta_path, json.dumps(meta).encode('utf-8'))
+
+    def touch(self, url, meta):
+        meta['last_used'] = time.time()
+        self.write_meta(url, meta)
+
+    def store(self, url, response):
+        body_path, meta_path = self.paths(url)
+        os.makedirs(os.path.dirname(body_path), exist_ok=True)
+        old_meta = self.lookup(url)
+        meta = {
+            "url": canonical_url(url),
+            "etag": response.headers.get('ETag'),
+            "last_modified": response.headers.get('Last-Modified'),
+            "content_type": response.headers.get('Content-Type'),
+            "size": len(response.content),
+            "last_used": time.time()
+        }
+        self.write_file(body_path, response.content)
+        self.write_meta(url, meta)
+        with self.lock:
+            self.stats["stored"] += 1
+            if self.total_bytes is not None:
+                self.total_bytes += meta["size"] - (old_meta["size"] if old_meta else 0)
+        self.evict()
+
+    def entries(self):
+        for folder, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith('.json'):
+                    try:
+                        with open(os.path.join(folder, name), encoding='utf-8') as f:
+                            yield os.path.join(folder, name[:-len('.json')]), json.load(f)
+                    except (OSError, ValueError):
+                        continue
+
+    # Remove the least recently used pages until the cache fits in max_bytes.
+    def evict(self):
+        with self.lock:
+            if self.total_bytes is None:
+                self.total_bytes = sum(meta.get("size", 0) for _, meta in self.entries())
+            if self.total_bytes <= self.max_bytes:
+                return
+            for path, meta in sorted(self.entries(), key=lambda entry: entry[1].get("last_used", 0)):
+                if self.total_bytes <= self.max_bytes:
+                    break
+                for extension in ('.body', '.json'):
+                    try:
+                        os.remove(path + extension)
+                    except OSError:
+                        pass
+                self.total_bytes -= meta.get("size", 0)
+                self.stats["evicted"] += 1
+
+    # Make a GET request, revalidating the cached copy of the page if we have one.
+    def get(self, url, **kwargs):
+        meta = self.lookup(url)
+        headers = {}
+        if meta is not None:
+            if meta.get("etag"):
+                headers['If-None-Match'] = meta["etag"]
+            if meta.get("last_modified"):
+                headers['If-Modified-Since'] = meta["last_modified"]
+        response = http_get(url, headers=headers, **kwargs)
+
+        if response.status_code == 304 and meta is not None:
+            try:
+                content = self.read_body(url)
+            except OSError:
+                # The body was evicted by another thread in the meantime, so we download the page again.
+                return http_get(url, **kwargs)
+            self.touch(url, meta)
+            with self.lock:
+                self.stats["revalidated"] += 1
+            return CachedResponse(url, content, {"Content-Type": meta.get("content_type") or ''})
+
+        with self.lock:
+            self.stats["downloaded"] += 1
+        # A page without validators can not be revalidated, so there is no point in keeping it.
+        cacheable = response.headers.get('ETag') or response.headers.get('Last-Modified')
+        if response.status_code == 200 and cacheable and 'no-store' not in response.headers.get('Cache-Control', ''):
+            self.store(url, response)
+        return response
+
+http_cache = None
+http_cache_lock = threading.Lock()
+
+# The cache is shared by every thread and is created the first time it is needed.
+def get_http_cache():
+    global http_cache
+    if http_cache_directory is None:
+        return None
+    with http_cache_lock:
+        if http_cache is None:
+            http_cache = HttpCache(http_cache_directory, http_cache_max_bytes)
+        return http_cache
+
+# WARC archives of the crawl.
+# With archive_mode "record" every response of fetch_page (status line, headers and body) and every DOM rendered by selenium
+# is written to gzipped WARC/1.1 files in archive_directory. With "replay" the crawl does not touch the network at all:
+# fetch_page and the selenium renders are answered from the archives, so changed selectors can be run over an old crawl at disk speed.
+# Every record is its own gzip member, as in the usual .warc.gz files, and next to every archive there is a
+# small index (<archive>.idx, one json line per record with the canonical url and the offset) so a record can be read without scanning.
+# When a url is in more than one archive the newest archive wins. archive_replay_pattern picks the archives that are replayed,
+# for example "crawl-20260101*" for a single day, so a month of crawls can be reprocessed one day at a time.
+archive_mode = None # None, "record" or "replay"
+archive_directory = 'archives'
+archive_max_file_bytes = 1024 * 1024 * 1024 # a new archive is started after this size
+archive_replay_pattern = 'crawl-*.warc.gz'
+
+def warc_digest(data):
+    return "sha1:" + base64.b32encode(hashlib.sha1(data).digest()).decode('ascii')
+
+# A gzipped WARC record. "url" is None for the warcinfo record.
+def warc_record(record_type, url, content_type, block, payload=None):
+    headers = [
+        ("WARC-Type", record_type),
+        ("WARC-Record-ID", f"<urn:uuid:{uuid.uuid4()}>"),
+        ("WARC-Date", time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()))
+    ]
+    if url is not None:
+        headers.append(("WARC-Target-URI", url))
+    headers.append(("WARC-Block-Digest", warc_digest(block)))
+    if payload is not None:
+        headers.append(("WARC-Payload-Digest", warc_digest(payload)))
+    headers += [("Content-Type", content_type), ("Content-Length", str(len(block)))]
+    head = "WARC/1.1\r\n" + "".join(f"{name}: {value}\r\n" for name, value in headers) + "\r\n"
+    return gzip.compress(head.encode('utf-8') + block + b"\r\n\r\n", compresslevel=6)
+
+# The HTTP response as it goes into a "response" record.
+# requests has already removed the gzip/brotli compression of the body, so the headers about the encoding are left out
+# and the Content-Length is the one of the stored body.
+def http_response_block(response):
+    lines = [f"HTTP/1.1 {response.status_code} {getattr(response, 'reason', None) or 'OK'}"]
+    for name, value in response.headers.items():
+        if name.lower() not in ('content-encoding', 'transfer-encoding', 'content-length'):
+            lines.append(f"{name}: {value}")
+    lines.append(f"Content-Length: {len(response.content)}")
+    return ("\r\n".join(lines) + "\r\n\r\n").encode('latin-1', errors='replace') + response.content
+
+# Split a (decompressed) WARC record into its headers and its block.
+def parse_warc_record(data):
+    head, _, rest = data.partition(b"\r\n\r\n")
+    headers = {}
+    for line in head.decode('utf-8').split("\r\n")[1:]:
+        name, _, value = line.partition(":")
+        headers[name.strip()] = value.strip()
+    return headers, rest[:int(headers.get("Content-Length", len(rest)))]
+
+# A response read from an archive. It has the attributes of a requests response that the scraper uses.
+class ArchivedResponse:
+    def __init__(self, url, block):
+        head, _, self.content = block.partition(b"\r\n\r\n")
+        lines = head.decode('latin-1').split("\r\n")
+        self.url = url
+        self.status_code = int(lines[0].split()[1])
+        self.headers = requests.structures.CaseInsensitiveDict(
+            (name.strip(), value.strip()) for name, _, value in (line.partition(":") for line in lines[1:])
+        )
+        self.from_archive = True
+
+# Writes the records of this process. Every process has its own archive files (the pid is in the name).
+class WarcWriter:
+    def __init__(self, directory, max_bytes):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.pid = os.getpid()
+        self.lock = threading.Lock()
+        self.file = None
+        self.index = None
+        self.files_written = 0
+        self.stats = {"responses": 0, "rendered pages": 0, "bytes": 0}
+
+    def open_file(self):
+        self.close()
+        name = f"crawl-{time.strftime('%Y%m%d%H%M%S')}-{self.pid}-{self.files_written:03d}.warc.gz"
+        self.path = os.path.join(self.directory, name)
+        self.file = open(self.path, 'wb')
+        self.index = open(self.path + '.idx', 'w', encoding='utf-8')
+        self.files_written += 1
+        info = "software: M151_EcommerseProject\r\nformat: WARC File Format 1.1\r\n".encode('utf-8')
+        self.file.write(warc_record("warcinfo", None, "application/warc-fields", info))
+
+    def write(self, record_type, url, content_type, block, payload=None, status=None):
+        record = warc_record(record_type, url, content_type, block, payload)
+        with self.lock:
+            if self.file is None or self.file.tell() >= self.max_bytes:
+                self.open_file()
+            offset = self.file.tell()
+            self.file.write(record)
+            self.index.write(json.dumps({"url": canonical_url(url), "type": record_type, "status": status, "offset": offset, "length": len(record)}) + "\n")
+            # Flushed after every record, so the index never points past the end of the archive.
+            self.file.flush()
+            self.index.flush()
+            self.stats["bytes"] += len(record)
+
+    def write_response(self, url, response):
+        self.write("response", url, "application/http;msgtype=response", http_response_block(response), response.content, response.status_code)
+        with self.lock:
+            self.stats["responses"] += 1
+
+    # A rendered DOM is not an HTTP response, so it is a "resource" record with just the HTML.
+    def write_rendered_page(self, url, page_source):
+        self.write("resource", url, "text/html; charset=utf-8", page_source.encode('utf-8'))
+        with self.lock:
+            self.stats["rendered pages"] += 1
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.index.close()
+            self.file = None
+
+# Find the records of an archive that has no index (for example when the crawl was killed), by walking its gzip members.
+def index_warc_file(path):
+    entries = []
+    offset = 0
+    with open(path, 'rb') as f:
+        while True:
+            f.seek(offset)
+            decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+            data = b''
+            while not decompressor.eof:
+                chunk = f.read(65536)
+                if not chunk:
+                    return entries # the end of the file, or a record that was cut in the middle
+                data += decompressor.decompress(chunk)
+            length = f.tell() - offset - len(decompressor.unused_data)
+            headers, block = parse_warc_record(data)
+            if headers.get("WARC-Type") in ("response", "resource"):
+                status = ArchivedResponse(None, block).status_code if headers["WARC-Type"] == "response" else None
+                entries.append({"url": canonical_url(headers["WARC-Target-URI"]), "type": headers["WARC-Type"], "status": status, "offset": offset, "length": length})
+            offset += length
+
+# The records of all the replayed archives, keyed by (record type, canonical url).
+class WarcArchive:
+    def __init__(self, directory, pattern):
+        self.records = {}
+        for path in sorted(glob.glob(os.path.join(directory, pattern))):
+            if os.path.exists(path + '.idx'):
+                with open(path + '.idx', encoding='utf-8') as f:
+                    entries = [json.loads(line) for line in f if line.strip()]
+            else:
+                entries = index_warc_file(path)
+            for entry in entries:
+                self.records[(entry["type"], entry["url"])] = (path, entry["offset"], entry["length"])
+        print(f"Replaying {len(self.records)} records from {directory}")
+
+    def read(self, record_type, url):
+        location = self.records.get((record_type, canonical_url(url)))
+        if location is None:
+            return None
+        path, offset, length = location
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            return parse_warc_record(gzip.decompress(f.read(length)))[1]
+
+    def response(self, url):
+        block = self.read("response", url)
+        return ArchivedResponse(url, block) if block is not None else None
+
+    def rendered_page(self, url):
+        block = self.read("resource", url)
+        return block.decode('utf-8') if block is not None else None
+
+warc_writer = None
+warc_archive = None
+warc_lock = threading.Lock()
+
+# The writer is created the first time something is recorded. A process that was forked from one with a writer gets its own.
+def get_warc_writer():
+    global warc_writer
+    with warc_lock:
+        if warc_writer is None or warc_writer.pid != os.getpid():
+            warc_writer = WarcWriter(archive_directory, archive_max_file_bytes)
+            atexit.register(warc_writer.close)
+        return warc_writer
+
+def get_warc_archive():
+    global warc_archive
+    with warc_lock:
+        if warc_archive is None:
+            warc_archive = WarcArchive(archive_directory, archive_replay_pattern)
+        return warc_archive
+
+# Make a GET request without exceeding the concurrency limit of the host.
+# Returns None if the request could not be made at all (timeout, connection error etc.).
+# The request is measured as "stage" of "site" (the host of the url if no site is given). The wait for the limits is included.
+# In archive_mode "replay" the response comes from the WARC archives, and a url that is not there is treated as a failed request.
+def fetch_page(url, max_concurrency=default_max_concurrency, stage='fetch', site=None):
+    cache = get_http_cache() if archive_mode != 'replay' else None
+    with measure(stage, site or urlparse(url).netloc) as measurement:
+        if archive_mode == 'replay':
+            response = get_warc_archive().response(url)
+            if response is None:
+                print(f"{url} is not in the archive")
+                measurement["error"] = True
+                return None
         else:
-            return "No description found", str(soup)
-    finally:
-        driver.quit() #End instance
+            with get_host_limit(url, max_concurrency):
+                try:
+                    if cache is not None:
+                        response = cache.get(url, timeout=30)
+                    else:
+                        response = http_get(url, timeout=30)
+                except requests.RequestException as e:
+                    print(f"Error while fetching {url}: {e}")
+                    measurement["error"] = True
+                    return None
+            if archive_mode == 'record':
+                get_warc_writer().write_response(url, response)
+        measurement["bytes"] = len(response.content)
+        measurement["error"] = response.status_code != 200
+        return response
 
-# Get product details.
-def extract_product_info(url, base_url, config):
-    response = requests.get(url) #make a GET request to the url.
-    # Dataframe creation. We use Dataframe to store all the data we get as seen below.
-    products = pd.DataFrame(columns=["HTML", "Description", "URL", "Price", "Image Info", "Content HTML", "Source", "Title", "Availability", "Product Code", "Brand"])
+# Fetch many pages concurrently. The responses are yielded in the same order as the urls.
+def iter_pages(urls, max_concurrency=default_max_concurrency, stage='fetch', site=None):
+    return iter_concurrently(lambda page_url: fetch_page(page_url, max_concurrency, stage, site), urls, max_concurrency)
+
+def fetch_pages(urls, max_concurrency=default_max_concurrency, stage='fetch', site=None):
+    return list(iter_pages(urls, max_concurrency, stage, site))
+
+# How a product page is fetched is set with the "render" key of the site config:
+#   "never"  (default) plain HTTP request, as for e-dructer and cosmomarket.
+#   "always" the page is rendered by a browser of the selenium pool.
+#   "auto"   plain HTTP request first. Only if some "product_page" fields come back empty the page is rendered with selenium,
+#            and only those fields are taken from the rendered page. This way the browser is used only when javascript is really needed.
+# For "auto" sites we count how many product pages needed the browser, and how many renders failed (the static fields were kept).
+render_stats = {}
+render_stats_lock = threading.Lock()
+
+def count_render(site, escalated):
+    with render_stats_lock:
+        stats = render_stats.setdefault(site, {"pages": 0, "rendered": 0, "failed": 0})
+        stats["pages"] += 1
+        stats["rendered"] += int(escalated)
+
+def count_render_failure(site):
+    with render_stats_lock:
+        render_stats.setdefault(site, {"pages": 0, "rendered": 0, "failed": 0})["failed"] += 1
+
+def print_render_stats():
+    with render_stats_lock:
+        for site, stats in render_stats.items():
+            rate = stats["rendered"] / stats["pages"] if stats["pages"] else 0
+            print(f"{site}: {stats['rendered']} of {stats['pages']} product pages needed the browser ({rate:.0%}), {stats['failed']} renders failed")
+
+def is_missing_field(value):
+    return value in missing_field_values.values() or value in ("No description found", "")
+
+# Fetch a product page and extract its fields, with the strategy of the "render" key of the config.
+# Returns (fields, page html), or None if the page could not be retrieved.
+def fetch_product_page_fields(product_url, config):
+    render = config.get('render', 'never')
+    fields = None
+    page_html = None
+
+    if render != 'always':
+        response = fetch_page(product_url, config.get('max_concurrency', default_max_concurrency), 'pdp_fetch', config['site'])
+        if response is not None and response.status_code == 200:
+            fields, page_html = extract_product_page_fields(response.content, config)
+        if render == 'never':
+            return (fields, page_html) if fields is not None else None
+
+    missing = list(config['product_page']) if fields is None else [field for field, value in fields.items() if is_missing_field(value)]
+    if render == 'auto':
+        count_render(config['site'], bool(missing))
+        if not missing:
+            return fields, page_html
+
+    try:
+        with measure('render', config['site']) as measurement:
+            rendered_page = fetch_product_page_with_selenium(product_url, config['product_page']['description'], get_driver_pool())
+            measurement["bytes"] = len(rendered_page)
+    except Exception as e:
+        # In "auto" mode the static fields are still better than nothing. A browser that died does not always raise a
+        # WebDriverException (see DriverPool.driver), so every error of the render is handled here. measure counted it as an error.
+        if render == 'auto' and fields is not None:
+            count_render_failure(config['site'])
+            print(f"Rendering {product_url} failed, keeping the static HTML fields: {e.__class__.__name__}")
+            return fields, page_html
+        raise
+    rendered_fields, page_html = extract_product_page_fields(rendered_page, config)
+    if fields is None:
+        fields = rendered_fields
+    else:
+        for field in missing:
+            fields[field] = rendered_fields[field]
+    return fields, page_html
+
+# Pagination of the category pages. A site config can have a "pagination" dictionary with either
+#   "page_links": selector of the links to the other pages (the numbered pagination bar), and optionally
+#   "next_link": selector of the "next page" link, for bars that only show a few pages around the current one
+# or
+#   "page_url": template of the url of page N, for example "{url}?page={page}"
+# plus "max_pages" (default below). Without a "pagination" key only the first page is read, as before.
+default_max_listing_pages = 50
+
+# Get the urls of the other listing pages that a page links to and that we have not seen yet.
+def find_listing_page_links(soup, page_url, pagination, parser, seen_pages):
+    links = []
+    for key in ('page_links', 'next_link'):
+        if key not in pagination:
+            continue
+        for tag in parser.select(soup, pagination[key]):
+            href = parser.attribute(tag, 'href')
+            if not href or href.startswith(('#', 'javascript:')):
+                continue
+            link = urljoin(page_url, href)
+            if canonical_url(link) not in seen_pages:
+                seen_pages.add(canonical_url(link))
+                links.append(link)
+    return links
+
+# Get the listings of every page of a category. The first page is already parsed.
+# The other pages are found from the pagination of the site config and downloaded concurrently, a group of pages at a time.
+# A product that shows up on more than one page is kept once.
+def extract_category_listings(url, base_url, config, parser, first_page):
+    max_concurrency = config.get('max_concurrency', default_max_concurrency)
+    listings = []
+    seen_products = set()
+
+    # Add the products of a page and return how many of them were new.
+    def add_listings(page):
+        new_products = 0
+        with measure('extract', config['site']):
+            for product in parser.select(page, get_selector_plan(config, parser).product_list):
+                listing = extract_listing_fields(product, base_url, config, parser)
+                if listing["URL"] not in seen_products:
+                    seen_products.add(listing["URL"])
+                    listings.append(listing)
+                    new_products += 1
+        return new_products
+
+    add_listings(first_page)
+    pagination = config.get('pagination')
+    if not pagination:
+        return listings
+    max_pages = pagination.get('max_pages', default_max_listing_pages)
+
+    if 'page_url' in pagination:
+        # The number of pages is not known, so we ask for max_concurrency pages at once and stop at the first page
+        # that fails or has no new products (some shops answer every page number after the last with the last page).
+        page_number = 2
+        while page_number <= max_pages:
+            numbers = range(page_number, min(page_number + max_concurrency, max_pages + 1))
+            page_urls = [pagination['page_url'].format(url=url, page=number) for number in numbers]
+            finished = False
+            for page_url, response in zip(page_urls, fetch_pages(page_urls, max_concurrency, 'plp_fetch', config['site'])):
+                if response is None or response.status_code != 200 or add_listings(parse_page(parser, response.content, config['site'])) == 0:
+                    finished = True
+                    break
+                print(f"Fetched content from {page_url}")
+            if finished:
+                break
+            page_number += len(numbers)
+    else:
+        # Every round downloads all the pages found so far, and the pagination of those pages gives the next round.
+        seen_pages = {canonical_url(url)}
+        page_urls = find_listing_page_links(first_page, url, pagination, parser, seen_pages)
+        pages_read = 1
+        while page_urls and pages_read < max_pages:
+            page_urls = page_urls[:max_pages - pages_read]
+            next_page_urls = []
+            for page_url, response in zip(page_urls, fetch_pages(page_urls, max_concurrency, 'plp_fetch', config['site'])):
+                if response is None or response.status_code != 200:
+                    print(f"failed to retrieve the listing page {page_url}")
+                    continue
+                page = parse_page(parser, response.content, config['site'])
+                add_listings(page)
+                print(f"Fetched content from {page_url}")
+                next_page_urls += find_listing_page_links(page, page_url, pagination, parser, seen_pages)
+            pages_read += len(page_urls)
+            page_urls = next_page_urls
+
+    return listings
+
+# Columns of the DataFrame that holds the products. Every product dictionary has these keys.
+product_columns = ["HTML", "Description", "URL", "Price", "Image Info", "Content HTML", "Source", "Title", "Availability", "Product Code", "Brand", "Listing Hash"]
+
+# Get product details, one dictionary per product.
+# This is a generator: a product is yielded as soon as its page has been fetched and parsed,
+# so the caller can store it (or throw it away) while the rest of the category is still being crawled.
+# For an incremental crawl pass the listing hashes of the previous run ({url: hash}, see load_listing_hashes).
+# Products whose hash has not changed are skipped completely: their product page is not fetched and nothing is yielded for them.
+def iter_product_info(url, base_url, config, known_hashes=None):
+    max_concurrency = config.get('max_concurrency', default_max_concurrency)
+    configure_host(url, config)
+    configure_host(base_url, config)
+    response = fetch_page(url, max_concurrency, 'plp_fetch', config['site']) #make a GET request to the url.
     
-    if response.status_code == 200: # Ensure that the request was a success.
-        soup = BeautifulSoup(response.content, 'html.parser') #Content parsing.
+    if response is not None and response.status_code == 200: # Ensure that the request was a success.
+        parser = get_html_parser(config)
+        soup = parse_page(parser, response.content, config['site']) #Content parsing.
         print(f"Fetched content from {url}") #This is kept to help us find out in which shop the code was "breaking".
 
-        product_items = soup.select(config['product_list'])
-        rows = [] #We use a list to temporarily store the data. Later we will feed the dataframe with the data in the rows list.
-        
         # Now we begin the data extraction.
         # We follow two different methods. We had some initial values and then we decided to add some more to make the result more appealing and we we inconsistent with our code.
-        for product in product_items:
-            html_content = str(product)
-            description_tag = product.select_one(config['description'])
-            description = description_tag.text.strip() if description_tag else 'No description'
+        # First we go through the PLP (all of its pages) and keep the fields of every product together with the link to its PDP.
+        listings = extract_category_listings(url, base_url, config, parser, soup)
+        del soup # Only the extracted fields are needed from now on.
 
-            # Given the different structure of the selected webpages we were forced to take into account many cases.
-            # This issue is very vibrant in the case of the coockshop web page
+        if known_hashes:
+            changed = [listing for listing in listings if known_hashes.get(listing["URL"]) != listing["Listing Hash"]]
+            print(f"{len(listings) - len(changed)} of {len(listings)} products are unchanged since the last run")
+            listings = changed
 
-            # Here we get the link tag
-            if config['site'] == 'cookshop':
-                link_tag = product.find('a', class_='wrap')
-            else:
-                if description_tag:
-                    link_tag = description_tag.find('a') 
-                else:
-                    None
-
-            # Here we construct the link tag. Again many cases were taken into account to fix all the possible issues.
-            relative_link = link_tag['href'] if link_tag else''
-            if relative_link.startswith('/'):
-                full_link = base_url + relative_link
-            elif relative_link.startswith('http'):
-                full_link = relative_link
-            elif relative_link:
-                full_link = base_url + '/' + relative_link
-            else:
-                full_link = base_url
-
-            # Price extraction
-            price_tag = product.select_one(config['price'])
-            price = price_tag.text.strip() if price_tag else 'No price'
-
-            # Image extraction
-            image_tag = product.select_one(config['image'])
-            if image_tag:
-                image_info = image_tag['src']
-                if image_info.startswith('//'):
-                    image_info = 'https:' + image_info
-                elif image_info.startswith('/'):
-                    image_info = base_url + image_info
-            else:
-                image_info = 'No image found'
+        # Then we download the product pages concurrently instead of one after another.
+        # Depending on the "render" key of the config a page is fetched with a plain request, the selenium pool, or both (see fetch_product_page_fields).
+        product_links = [listing["URL"] for listing in listings]
+        product_pages = iter_concurrently(lambda product_url: fetch_product_page_fields(product_url, config), product_links, max_concurrency)
 
+        for listing, product_page in zip(listings, product_pages):
             # Initilize the values of the second batch of fields.
             # Here we don't take all the cases directly when looking for the tags but we seperate from the start the shops and set things right from the beginning.
+            description = listing["Description"]
             title = 'No title'
             availability = 'No availability info'
             product_code = 'No product code'
             brand = 'No brand'
             product_page_html = 'No product page HTML'
 
-            # We start with coockshop.
-            if config['site'] == 'cookshop':
-                description, product_page_html = fetch_product_description_with_selenium(full_link, config['product_page']['description'])
-
-                # Title extraction
-                title_tag = BeautifulSoup(product_page_html, 'html.parser').select_one(config['product_page']['title'])                
-                if title_tag:
-                    title = title_tag.text.strip()
-                else:
-                    title = 'No title'
-
-                # Availability extraction    
-                availability_tag = BeautifulSoup(product_page_html, 'html.parser').select_one(config['product_page']['availability'])
-                if availability_tag:
-                    availability = availability_tag.text.strip()
-                else:
-                    availability = 'No availability info'
-
-                # Product code extraction    
-                product_code_tag = BeautifulSoup(product_page_html, 'html.parser').select_one(config['product_page']['product_code'])
-                if product_code_tag:
-                    product_code = product_code_tag.text.strip()
-                else:
-                    product_code = 'No product code'
-
-                # Brand extraction
-                brand_tag = BeautifulSoup(product_page_html, 'html.parser').select_one(config['brand'])
-                if brand_tag:
-                    brand = brand_tag.text.strip()
-                else:
-                    brand = 'No brand'
-            # Now we go for the rest of the shops
+            if product_page is not None:
+                # Title, description, availability, product code (and brand for cookshop) all come from a single parse of the product page.
+                fields, product_page_html = product_page
+                title = fields['title']
+                description = fields['description']
+                availability = fields['availability']
+                product_code = fields['product_code']
+                brand = fields.get('brand', listing["Brand"])
             else:
-                product_response = requests.get(full_link)
-                if product_response.status_code == 200:
-                    product_page_html = BeautifulSoup(product_response.content, 'html.parser')
-                    
-                    title_tag = product_page_html.select_one(config['product_page']['title'])
-                    # Title extraction
-                    if title_tag:
-                        title = title_tag.text.strip() 
-                    else:
-                        title = 'No title'
-                        
-                    # Description extraction
-                    description_tag = product_page_html.select_one(config['product_page']['description'])
-                    if description_tag:
-                        description = description_tag.text.strip()
-                    else:
-                        description = 'No description'
-                      
-                    # For the availability we had to take again two cases.
-                    # Availability extraction
-                    if config['site'] == 'e-druster':
-                        availability_tag = product_page_html.select_one("span[style*='font-size:11px;display:inline-block;color:green;margin-left: -5px;margin-top: 5px']")
-                        if availability_tag:
-                            availability = availability_tag.text.strip()
-                        else:
-                            availability = 'No availability info'
-                    else:
-                        availability_tag = product_page_html.select_one(config['product_page']['availability'])
-                        if availability_tag:
-                            availability = availability_tag.text.strip() 
-                        else:
-                            availability = 'No availability info'
-                          
-                    # Product code extraction
-                    # Here we took into account cases where the information about brand is optional or/and not provided
-                    product_code_tag = product_page_html.select_one(config['product_page']['product_code'])
-                    if product_code_tag:
-                        product_code = product_code_tag.text.strip() 
-                    else:
-                        product_code = 'No product code'
-
-                    if 'brand' in config:
-                        brand_tag = product.select_one(config['brand'])
-                        if brand_tag:
-                            brand = brand_tag.text.strip() 
-                        else:
-                            brand = 'No brand'
-                    else:
-                        brand = 'No brand'
-                else:
-                    product_page_html = 'failed to retrieve content'
+                product_page_html = 'failed to retrieve content'
 
-            # Append product details in the rows list.
-            rows.append({
-                "HTML": html_content, 
+            # Without a product page the row is incomplete, so we store no hash and the product is fetched again next time.
+            yield {
+                "HTML": listing["HTML"], 
                 "Description": description, 
-                "URL": full_link, 
-                "Price": price,
-                "Image Info": image_info,
+                "URL": listing["URL"], 
+                "Price": listing["Price"],
+                "Image Info": listing["Image Info"],
                 "Content HTML": product_page_html, 
                 "Source": base_url,
                 "Title": title,
                 "Availability": availability,
                 "Product Code": product_code, 
-                "Brand": brand
-            })
+                "Brand": brand,
+                "Listing Hash": listing["Listing Hash"] if product_page is not None else None
+            }
+        if config.get('render') == 'auto':
+            print_render_stats()
+    elif response is not None:
+        print(f"failed to retrieve the page, status code {response.status_code}")
+    else:
+        print(f"failed to retrieve the page {url}")
+
+# Get product details as a DataFrame.
+def extract_product_info(url, base_url, config, known_hashes=None):
+    # Dataframe creation. We use Dataframe to store all the data we get as seen below.
+    return pd.DataFrame(list(iter_product_info(url, base_url, config, known_hashes)), columns=product_columns)
+
+# Run the jobs of one shop, one after another, and measure how long each job took.
+# This is what a worker process of run_site_jobs_in_processes does. The metrics of the process are returned with the results.
+# "archive" is the archive_mode of the run. A spawned worker (the default on Windows and macOS) imports the module again
+# and would otherwise get the default of archive_mode instead of the one that the main process set.
+def run_shop_jobs(jobs, known_hashes=None, archive=None):
+    global archive_mode
+    if archive is not None:
+        archive_mode = archive
+    results = []
+    try:
+        for url, base_url, config in jobs:
+            start = time.perf_counter()
+            try:
+                products = extract_product_info(url, base_url, config, known_hashes)
+            except Exception as e:
+                print(f"Error while crawling {url}: {e}")
+                products = pd.DataFrame(columns=product_columns)
+            results.append((products, time.perf_counter() - start))
+    finally:
+        close_driver_pool() # Every process has its own browsers.
+        print_connection_stats() # and its own HTTP sessions.
+    return results, metrics_snapshot()
+
+# Run the site jobs in a pool of processes, so a slow shop does not hold back the others and the parsing uses more than one core.
+# The jobs of the same shop (same host) go to the same process and run one after another: this keeps the per-host
+# concurrency limit and the selenium pool per shop, as in a single process run.
+# Returns all the products in one DataFrame and prints the wall time of every job.
+def run_site_jobs_in_processes(jobs, processes=None, known_hashes=None):
+    jobs_per_host = {}
+    for job in jobs:
+        jobs_per_host.setdefault(urlparse(job[0]).netloc, []).append(job)
+    # By default every shop gets its own process: the crawl mostly waits on the network, so this helps even with fewer cores than shops.
+    processes = processes or len(jobs_per_host)
+
+    start = time.perf_counter()
+    all_products = []
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        futures = {host: executor.submit(run_shop_jobs, host_jobs, known_hashes, archive_mode) for host, host_jobs in jobs_per_host.items()}
+        for host, future in futures.items():
+            results, worker_metrics = future.result()
+            merge_metrics(worker_metrics)
+            for (url, base_url, config), (products, elapsed) in zip(jobs_per_host[host], results):
+                print(f"{config['site']} ({url[:80]}): {len(products)} products in {elapsed:.1f} seconds")
+                all_products.append(products)
+    print(f"All sites: {sum(len(products) for products in all_products)} products in {time.perf_counter() - start:.1f} seconds with {processes} processes")
+    return pd.concat(all_products, ignore_index=True)
+
+# Columns of the MySQL table, in the same order as the columns of the DataFrame.
+# The last two are the SHA-256 of the HTML and Content_HTML columns, which point into the HTML blob table (see below).
+table_columns = ["HTML", "Description", "URL", "Price", "Image_Info", "Content_HTML", "Source", "Title", "Availability", "Product_Code", "Brand", "Listing_Hash", "HTML_Hash", "Content_HTML_Hash"]
+html_columns = [table_columns.index("HTML"), table_columns.index("Content_HTML")]
+
+# How many rows are sent in one INSERT statement and committed in one transaction.
+# It can be changed with the "batch_size" key of the db_config. With a batch size of 1 every row is its own statement, as it used to be.
+default_batch_size = 200
+
+# Build an INSERT ... ON DUPLICATE KEY UPDATE statement for "row_count" rows.
+def build_upsert_query(table_name, row_count, columns=table_columns):
+    placeholders = "(" + ", ".join(["%s"] * len(columns)) + ")"
+    updates = ",\n    ".join(f"{column}=VALUES({column})" for column in columns if column != "URL")
+    return (
+        f"INSERT INTO {table_name} ({', '.join(columns)})\n"
+        f"VALUES {', '.join([placeholders] * row_count)}\n"
+        f"ON DUPLICATE KEY UPDATE\n    {updates};"
+    )
+
+# Rough size of a row inside the INSERT statement.
+def row_size(row):
+    return sum(len(str(value).encode('utf-8')) + 4 for value in row if value is not None)
+
+# Split the rows into batches of at most "batch_size" rows and at most "max_bytes" bytes.
+# A single row that is bigger than "max_bytes" gets a batch of its own.
+def split_into_batches(rows, batch_size, max_bytes):
+    batch = []
+    batch_bytes = 0
+    for row in rows:
+        size = row_size(row)
+        if batch and (len(batch) >= batch_size or batch_bytes + size > max_bytes):
+            yield batch
+            batch = []
+            batch_bytes = 0
+        batch.append(row)
+        batch_bytes += size
+    if batch:
+        yield batch
+
+# MySQL refuses statements bigger than max_allowed_packet. We keep every batch to half of it,
+# because the escaping of the values can make the statement bigger than the raw data.
+def get_batch_byte_limit(cursor):
+    cursor.execute("SELECT @@max_allowed_packet")
+    return int(cursor.fetchone()[0]) // 2
+
+# Convert a row of the DataFrame to the values that are sent to MySQL.
+def to_table_row(row):
+    # Convert BeautifulSoup objects to strings in order to be able to store them the MySQL base
+    return tuple(str(value) if isinstance(value, BeautifulSoup) else value for value in row)
+
+# HTML storage.
+# With "html_storage": "blobs" in the db_config the listing snippet and the product page are not written into the HTML and
+# Content_HTML columns of every row. Each distinct page is compressed and stored once in the <table>_html_blobs table,
+# keyed by its SHA-256, and the product row keeps only the hashes (HTML_Hash and Content_HTML_Hash).
+# "html_compression" is "zlib" (the default) or "zstd" (pip install zstandard).
+# zlib blobs use the format of MySQL's COMPRESS(), so they can also be read in SQL with UNCOMPRESS(Data).
+default_html_storage = 'inline'
+default_html_compression = 'zlib'
+
+def html_blob_table(table_name):
+    return f"{table_name}_html_blobs"
+
+def html_hash(html):
+    if not isinstance(html, str):
+        return None
+    return hashlib.sha256(html.encode('utf-8')).hexdigest()
+
+def compress_html(html, compression):
+    data = html.encode('utf-8')
+    if compression == 'zstd':
+        import zstandard
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    if not data:
+        return b''
+    # COMPRESS() format: the length of the uncompressed data as 4 bytes (little endian), followed by the zlib stream.
+    return struct.pack('<I', len(data)) + zlib.compress(data, 6)
+
+def decompress_html(data, compression):
+    if compression == 'zstd':
+        import zstandard
+        return zstandard.ZstdDecompressor().decompress(data).decode('utf-8')
+    return zlib.decompress(data[4:]).decode('utf-8') if data else ''
+
+def create_html_blob_table(cursor, table_name):
+    cursor.execute(f"""
+    CREATE TABLE IF NOT EXISTS {html_blob_table(table_name)} (
+        Hash CHAR(64) PRIMARY KEY,
+        Compression VARCHAR(8) NOT NULL,
+        Size INT NOT NULL,
+        Data LONGBLOB NOT NULL
+    );
+    """)
+
+# Add the hashes of the HTML columns to a batch of rows. In "blobs" mode the HTML itself is removed from the rows
+# and returned as {hash: html}, with every distinct page once.
+def hash_html_columns(batch, html_storage):
+    blobs = {}
+    rows = []
+    for row in batch:
+        row = list(row)
+        hashes = []
+        for column in html_columns:
+            digest = html_hash(row[column])
+            hashes.append(digest)
+            if html_storage == 'blobs':
+                if digest is not None:
+                    blobs[digest] = row[column]
+                row[column] = None
+        rows.append(tuple(row) + tuple(hashes))
+    return rows, blobs
+
+# Add the hashes of the HTML columns to a batch of rows. In "blobs" mode the pages that are not in the blob table yet
+# are compressed and written there, in the same transaction as the rows.
+def store_html(cursor, table_name, batch, html_storage, compression):
+    rows, blobs = hash_html_columns(batch, html_storage)
+    if blobs:
+        # Most pages are already stored from earlier batches or runs, so we only send the ones that are missing.
+        cursor.execute(f"SELECT Hash FROM {html_blob_table(table_name)} WHERE Hash IN ({', '.join(['%s'] * len(blobs))})", list(blobs))
+        for (digest,) in cursor.fetchall():
+            del blobs[digest]
+    if blobs:
+        values = []
+        for digest, html in blobs.items():
+            values += [digest, compression, len(html.encode('utf-8')), compress_html(html, compression)]
+        cursor.execute(
+            f"INSERT IGNORE INTO {html_blob_table(table_name)} (Hash, Compression, Size, Data) VALUES {', '.join(['(%s, %s, %s, %s)'] * len(blobs))}",
+            values
+        )
+    return rows
+
+# Get the HTML that a hash points to, for example the Content_HTML_Hash of a product. Returns None if there is no such blob.
+def load_html(cursor, table_name, digest):
+    cursor.execute(f"SELECT Compression, Data FROM {html_blob_table(table_name)} WHERE Hash = %s", (digest,))
+    blob = cursor.fetchone()
+    return decompress_html(blob[1], blob[0]) if blob else None
+
+# Table schema, set with the "schema" key of the db_config.
+# "text" is the original table: every field is stored as the string we scraped, with "No ..." when it was not found.
+# "typed" is for reporting: the price is a DECIMAL with its currency in a separate column, the availability is one of
+# availability_values (the scraped text is kept in Availability_Text), fields that were not found are NULL, and there are
+# indexes on (Source, Price), Price and Product_Code, so price range queries do not scan the table.
+# The two schemas can not share a table: the typed one needs its own table name, for example "product_data_typed".
+default_schema = 'text'
+typed_table_columns = table_columns + ["Currency", "Availability_Text"]
+default_currency = 'EUR' # e-dructer shows the € sign outside the price tag, so a price without a symbol is in euros
+currency_symbols = {'€': 'EUR', 'EUR': 'EUR', '$': 'USD', 'USD': 'USD', '£': 'GBP', 'GBP': 'GBP'}
+
+# The values that the scraper writes when a field or a page was not found. In the typed schema they become NULL.
+missing_values = set(missing_field_values.values()) | {
+    'No description found', 'No price', 'No image found', 'No product page HTML', 'failed to retrieve content', ''
+}
+
+# Keywords of the availability texts of the shops, without accents and in lower case, checked in this order
+# (so "μη διαθεσιμο" is out of stock and "διαθεσιμο σε 4-10 ημερες" is on order before plain "διαθεσιμο" is in stock).
+availability_keywords = [
+    ("out_of_stock", ["εξαντλ", "μη διαθεσ", "δεν ειναι διαθεσ", "out of stock", "sold out", "unavailable"]),
+    ("preorder", ["προπαραγγελ", "pre-order", "preorder"]),
+    ("on_order", ["κατοπιν παραγγελ", "κατ' παραγγελ", "ημερ", "εβδομαδ", "on order", "backorder"]),
+    ("limited", ["περιορισμεν", "τελευται", "limited", "low stock"]),
+    ("in_stock", ["διαθεσιμ", "σε αποθεμα", "in stock", "available"])
+]
+availability_values = [value for value, _ in availability_keywords] + ["unknown"]
+
+price_pattern = re.compile(r"\d+(?:[.,]\d+)*")
+
+# Parse a scraped price like "1.299,90 €" or "129,90" into (Decimal, currency). Returns (None, None) if there is no number.
+# When the tag holds more than one price (old and new price of a product on sale) the last one is taken.
+def parse_price(text):
+    if text is None or text in missing_values:
+        return None, None
+    numbers = price_pattern.findall(text)
+    if not numbers:
+        return None, None
+    number = numbers[-1]
+    # The greek format uses "." for thousands and "," for decimals. When both are there, the last one is the decimal point
+    # (1,299.90 is the english format). A single "." with one or two digits after it is a decimal point too.
+    if ',' in number and '.' in number and number.rfind('.') > number.rfind(','):
+        number = number.replace(',', '')
+    elif ',' in number:
+        number = number.replace('.', '').replace(',', '.')
+    elif not re.fullmatch(r"\d+\.\d{1,2}", number):
+        number = number.replace('.', '')
+    try:
+        price = Decimal(number).quantize(Decimal('0.01'))
+    except InvalidOperation:
+        return None, None
+    currency = next((code for symbol, code in currency_symbols.items() if symbol in text.upper()), default_currency)
+    return price, currency
+
+def strip_accents(text):
+    text = unicodedata.normalize('NFD', text.lower())
+    return "".join(character for character in text if unicodedata.category(character) != 'Mn').replace('ς', 'σ')
+
+# Map the availability text of a shop to one of availability_values, or None if it was not found.
+def normalize_availability(text):
+    if text is None or text in missing_values:
+        return None
+    text = strip_accents(text)
+    for value, keywords in availability_keywords:
+        if any(keyword in text for keyword in keywords):
+            return value
+    return "unknown"
+
+def without_missing_values(row):
+    return tuple(None if isinstance(value, str) and value in missing_values else value for value in row)
 
-        # Insert product rows in the dataFrame.
-        products = pd.concat([products, pd.DataFrame(rows)], ignore_index=True)
+# Turn a row of table_columns into a row of typed_table_columns.
+def to_typed_row(row):
+    values = list(row)
+    price_column = table_columns.index("Price")
+    availability_column = table_columns.index("Availability")
+    price, currency = parse_price(values[price_column])
+    availability_text = values[availability_column]
+    values[price_column] = price
+    values[availability_column] = normalize_availability(availability_text)
+    return tuple(values) + (currency, availability_text)
+
+def create_typed_product_table(cursor, table_name):
+    availability_enum = ", ".join(f"'{value}'" for value in availability_values)
+    cursor.execute(f"""
+    CREATE TABLE IF NOT EXISTS {table_name} (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        HTML TEXT,
+        Description TEXT,
+        URL VARCHAR(2083),
+        Price DECIMAL(10, 2) NULL,
+        Image_Info TEXT,
+        Content_HTML LONGTEXT,
+        Source VARCHAR(255),
+        Title VARCHAR(255),
+        Availability ENUM({availability_enum}) NULL,
+        Product_Code VARCHAR(255),
+        Brand VARCHAR(255),
+        Listing_Hash CHAR(64),
+        HTML_Hash CHAR(64),
+        Content_HTML_Hash CHAR(64),
+        Currency CHAR(3) NULL,
+        Availability_Text VARCHAR(255) NULL,
+        UNIQUE KEY unique_url (URL(255)),
+        KEY source_price (Source, Price),
+        KEY price (Price),
+        KEY product_code (Product_Code)
+    );
+    """)
+    # A table that was created with the text schema would take the strings of the prices, or fail on the new columns.
+    cursor.execute(
+        "SELECT DATA_TYPE FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = 'Price'",
+        (table_name,)
+    )
+    column = cursor.fetchone()
+    price_type = column[0] if column is not None else None
+    if isinstance(price_type, bytes):
+        price_type = price_type.decode()
+    if price_type is not None and price_type.lower() != 'decimal':
+        raise ValueError(f"The table '{table_name}' has the text schema. Use another table name for the typed schema.")
+
+# Price and availability history.
+# The upsert overwrites the Price and Availability of a product, so with "history": True in the db_config every run also
+# appends them to <table>_history, but only for the products whose values are different from their last history row.
+# The table is partitioned by month (a partition is added before the first write of every month), so old months can be
+# dropped or archived and queries over a date range only read their own months. Its primary key (product_id, crawled_at)
+# makes "the last row of a product" an index lookup, and the <table>_latest view gives the latest row of every product.
+# product_id is the id of the product in the product table.
+def history_table(table_name):
+    return f"{table_name}_history"
+
+def latest_history_view(table_name):
+    return f"{table_name}_latest"
+
+def month_partition(year, month):
+    next_year, next_month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return f"p{year:04d}{month:02d}", f"{next_year:04d}-{next_month:02d}-01"
+
+# Make sure that the month of "crawled_at" and the one after it have their partitions.
+# New months are split off the empty catch-all partition p_future, which is cheap.
+def add_history_partitions(cursor, table_name, crawled_at):
+    cursor.execute(
+        "SELECT PARTITION_NAME FROM information_schema.PARTITIONS WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+        (history_table(table_name),)
+    )
+    existing = {name.decode() if isinstance(name, bytes) else name for (name,) in cursor.fetchall()}
+    last_month = max((name for name in existing if name != 'p_future'), default='')
+    year, month = crawled_at.year, crawled_at.month
+    new_partitions = []
+    for _ in range(2):
+        name, end = month_partition(year, month)
+        if name > last_month:
+            new_partitions.append(f"PARTITION {name} VALUES LESS THAN (TO_DAYS('{end}'))")
+        year, month = int(end[:4]), int(end[5:7])
+    if new_partitions:
+        cursor.execute(
+            f"ALTER TABLE {history_table(table_name)} REORGANIZE PARTITION p_future INTO "
+            f"({', '.join(new_partitions)}, PARTITION p_future VALUES LESS THAN MAXVALUE)"
+        )
+
+def create_history_table(cursor, table_name, schema, crawled_at):
+    if schema == 'typed':
+        price_type = "DECIMAL(10, 2) NULL"
+        availability_type = "ENUM(" + ", ".join(f"'{value}'" for value in availability_values) + ") NULL"
     else:
-        print(f"failed to retrieve the page, status code {response.status_code}")
+        price_type = availability_type = "VARCHAR(255)"
+    cursor.execute(f"""
+    CREATE TABLE IF NOT EXISTS {history_table(table_name)} (
+        product_id INT NOT NULL,
+        crawled_at DATETIME NOT NULL,
+        Price {price_type},
+        Availability {availability_type},
+        PRIMARY KEY (product_id, crawled_at)
+    )
+    PARTITION BY RANGE (TO_DAYS(crawled_at)) (
+        PARTITION p_future VALUES LESS THAN MAXVALUE
+    );
+    """)
+    add_history_partitions(cursor, table_name, crawled_at)
+    # The MAX(crawled_at) per product is read from the primary key, without touching the rest of the rows.
+    cursor.execute(f"""
+    CREATE OR REPLACE VIEW {latest_history_view(table_name)} AS
+    SELECT h.product_id, p.URL, p.Source, p.Title, h.crawled_at, h.Price, h.Availability
+    FROM {history_table(table_name)} h
+    JOIN (SELECT product_id, MAX(crawled_at) AS crawled_at FROM {history_table(table_name)} GROUP BY product_id) latest
+        ON latest.product_id = h.product_id AND latest.crawled_at = h.crawled_at
+    JOIN {table_name} p ON p.id = h.product_id;
+    """)
 
-    return products 
+# Append a history row for every product of the (already upserted) batch whose price or availability changed.
+# Returns the number of rows that were added.
+def record_history(cursor, table_name, batch, columns, crawled_at):
+    url_column = columns.index("URL")
+    price_column = columns.index("Price")
+    availability_column = columns.index("Availability")
+    current = {row[url_column]: (row[price_column], row[availability_column]) for row in batch}
+    cursor.execute(f"SELECT id, URL FROM {table_name} WHERE URL IN ({', '.join(['%s'] * len(current))})", list(current))
+    ids = {url: product_id for product_id, url in cursor.fetchall()}
+    if not ids:
+        return 0
 
-# Store data in a MySQL database
-def store_data_in_mysql(data, table_name, db_config):
+    cursor.execute(f"""
+    SELECT h.product_id, h.Price, h.Availability
+    FROM {history_table(table_name)} h
+    JOIN (SELECT product_id, MAX(crawled_at) AS crawled_at FROM {history_table(table_name)}
+          WHERE product_id IN ({', '.join(['%s'] * len(ids))}) GROUP BY product_id) latest
+        ON latest.product_id = h.product_id AND latest.crawled_at = h.crawled_at
+    """, list(ids.values()))
+    last_values = {product_id: (price, availability) for product_id, price, availability in cursor.fetchall()}
+
+    values = []
+    for url, (price, availability) in current.items():
+        product_id = ids.get(url)
+        if product_id is not None and last_values.get(product_id) != (price, availability):
+            values += [product_id, crawled_at, price, availability]
+    if values:
+        cursor.execute(
+            f"INSERT IGNORE INTO {history_table(table_name)} (product_id, crawled_at, Price, Availability) VALUES {', '.join(['(%s, %s, %s, %s)'] * (len(values) // 4))}",
+            values
+        )
+    return len(values) // 4
+
+# The rows as they are sent to write_batch. In the typed schema the "No ..." values are removed
+# before store_html, so no "failed to retrieve content" page is stored as a blob.
+def prepare_rows(rows, schema):
+    if schema == 'typed':
+        return (without_missing_values(row) for row in rows)
+    return rows
+
+# Write one batch: one multi-row INSERT statement and one transaction.
+# "queries" caches the statement of every batch length. Returns the number of history rows that were added.
+# With "history" the changes of price and availability go to the history table in the same transaction, stamped with "crawled_at".
+def write_batch(connection, cursor, batch, table_name, queries, html_storage, html_compression, schema, history, crawled_at):
+    columns = typed_table_columns if schema == 'typed' else table_columns
+    history_rows = 0
+    with measure('db_write', table_name) as measurement:
+        batch = store_html(cursor, table_name, batch, html_storage, html_compression)
+        if schema == 'typed':
+            batch = [to_typed_row(row) for row in batch]
+        if len(batch) not in queries:
+            queries[len(batch)] = build_upsert_query(table_name, len(batch), columns)
+        measurement["bytes"] = sum(row_size(row) for row in batch)
+        cursor.execute(queries[len(batch)], [value for row in batch for value in row])
+        if history:
+            history_rows = record_history(cursor, table_name, batch, columns, crawled_at)
+        connection.commit()
+    return history_rows
+
+# Send the rows in batches: one multi-row INSERT statement and one transaction per batch.
+# The statement for a full batch is built once and reused. Returns the number of rows that were written.
+def write_rows_in_batches(connection, cursor, rows, table_name, batch_size, html_storage=default_html_storage, html_compression=default_html_compression, schema=default_schema, history=False, crawled_at=None):
+    max_bytes = get_batch_byte_limit(cursor)
+    queries = {}
+    written = 0
+    history_rows = 0
+    crawled_at = crawled_at or datetime.now().replace(microsecond=0)
+    for batch in split_into_batches(prepare_rows(rows, schema), batch_size, max_bytes):
+        history_rows += write_batch(connection, cursor, batch, table_name, queries, html_storage, html_compression, schema, history, crawled_at)
+        written += len(batch)
+    if history:
+        print(f"{history_rows} changes of price or availability were added to '{history_table(table_name)}'")
+    return written
+
+# Parallel writers.
+# With "writer_threads" above 1 in the db_config the batches are put in a queue and written by that many threads,
+# each with its own connection from a connection pool ("pool_size", at least one more than the writers, for the main connection).
+# Concurrent upserts into the same unique index can deadlock in InnoDB. The batch that MySQL picked as the victim is rolled back
+# and tried again after a short pause.
+default_writer_threads = 1
+deadlock_errors = {1213, 1205} # ER_LOCK_DEADLOCK, ER_LOCK_WAIT_TIMEOUT
+deadlock_retries = 5
+
+def write_batch_with_retry(connection, cursor, batch, table_name, queries, html_storage, html_compression, schema, history, crawled_at):
+    for attempt in range(deadlock_retries + 1):
+        try:
+            return write_batch(connection, cursor, batch, table_name, queries, html_storage, html_compression, schema, history, crawled_at)
+        except Error as e:
+            connection.rollback()
+            if e.errno not in deadlock_errors or attempt == deadlock_retries:
+                raise
+            print(f"Deadlock while writing a batch of {len(batch)} rows, trying again ({attempt + 1}/{deadlock_retries})")
+            time.sleep(0.05 * 2 ** attempt)
+
+# Same as write_rows_in_batches, with "workers" threads that drain a queue of batches.
+# The queue is bounded, so a fast producer waits for the writers instead of piling up rows in memory.
+# If a writer fails the remaining batches are dropped and the error is raised here.
+def write_rows_in_parallel(db_config, rows, table_name, batch_size, max_bytes, workers, html_storage=default_html_storage, html_compression=default_html_compression, schema=default_schema, history=False, crawled_at=None):
+    crawled_at = crawled_at or datetime.now().replace(microsecond=0)
+    batches = queue.Queue(maxsize=workers * 2)
+    totals = {"written": 0, "history": 0}
+    totals_lock = threading.Lock()
+    errors = []
+
+    def writer():
+        connection = None
+        try:
+            connection = connect_to_mysql(db_config)
+            cursor = connection.cursor()
+        except Error as e:
+            errors.append(e)
+        queries = {}
+        while True:
+            batch = batches.get()
+            if batch is None:
+                break
+            if errors:
+                continue # only drain the queue, so the producer is not blocked
+            try:
+                history_rows = write_batch_with_retry(connection, cursor, batch, table_name, queries, html_storage, html_compression, schema, history, crawled_at)
+                with totals_lock:
+                    totals["written"] += len(batch)
+                    totals["history"] += history_rows
+            except Exception as e:
+                errors.append(e)
+        if connection is not None:
+            cursor.close()
+            connection.close()
+
+    threads = [threading.Thread(target=writer, daemon=True) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
     try:
-        connection = mysql.connector.connect(
-            host=db_config['host'],
-            user=db_config['user'],
-            password=db_config['password'],
-            database=db_config['database']
+        for batch in split_into_batches(prepare_rows(rows, schema), batch_size, max_bytes):
+            if errors:
+                break
+            batches.put(batch)
+    finally:
+        for _ in threads:
+            batches.put(None)
+        for thread in threads:
+            thread.join()
+    if errors:
+        raise errors[0]
+    if history:
+        print(f"{totals['history']} changes of price or availability were added to '{history_table(table_name)}'")
+    return totals["written"]
+
+# Bulk load, for full re-crawls ("write_mode": "bulk" in the db_config).
+# Instead of INSERT statements the rows are written to a temporary tab separated file, loaded with LOAD DATA LOCAL INFILE
+# into a temporary staging table with the same columns, and merged into the product table with a single
+# INSERT ... SELECT ... ON DUPLICATE KEY UPDATE. The history (if it is on) is also written with one INSERT ... SELECT.
+# The server must allow it (SET GLOBAL local_infile = 1); the connection asks for it when the write mode is "bulk".
+# The HTML blobs are still written batch by batch, because the hashes of the rows come from there.
+default_write_mode = 'batches'
+
+# A value in the format that LOAD DATA reads by default: \N is NULL, and backslash, tab and new lines are escaped.
+def tsv_value(value):
+    if value is None or (isinstance(value, float) and value != value):
+        return "\\N"
+    return str(value).replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r").replace("\0", "\\0")
+
+def staging_table(table_name):
+    return f"{table_name}_staging"
+
+# Write the rows with LOAD DATA and one merge statement. Returns the number of rows that were loaded.
+def bulk_load_rows(connection, cursor, rows, table_name, batch_size, html_storage=default_html_storage, html_compression=default_html_compression, schema=default_schema, history=False, crawled_at=None):
+    crawled_at = crawled_at or datetime.now().replace(microsecond=0)
+    columns = typed_table_columns if schema == 'typed' else table_columns
+    max_bytes = get_batch_byte_limit(cursor)
+    start = time.perf_counter()
+    loaded = 0
+    f = tempfile.NamedTemporaryFile('w', encoding='utf-8', newline='\n', suffix='.tsv', delete=False)
+    path = f.name
+    # The file holds the whole crawl, so it is removed whatever fails: the crawl, the blobs, the load or the merge.
+    try:
+        with f:
+            for batch in split_into_batches(prepare_rows(rows, schema), batch_size, max_bytes):
+                batch = store_html(cursor, table_name, batch, html_storage, html_compression)
+                if schema == 'typed':
+                    batch = [to_typed_row(row) for row in batch]
+                for row in batch:
+                    f.write("\t".join(tsv_value(value) for value in row) + "\n")
+                loaded += len(batch)
+        file_time = time.perf_counter() - start
+
+        with measure('db_write', table_name) as measurement:
+            measurement["bytes"] = os.path.getsize(path)
+            start = time.perf_counter()
+            cursor.execute(f"DROP TEMPORARY TABLE IF EXISTS {staging_table(table_name)}")
+            cursor.execute(f"CREATE TEMPORARY TABLE {staging_table(table_name)} LIKE {table_name}")
+            # REPLACE: when a url is in the file twice the last row wins, as with the upserts of the other write modes.
+            cursor.execute(
+                f"LOAD DATA LOCAL INFILE %s REPLACE INTO TABLE {staging_table(table_name)} CHARACTER SET utf8mb4 "
+                f"FIELDS TERMINATED BY '\\t' ESCAPED BY '\\\\' LINES TERMINATED BY '\\n' ({', '.join(columns)})",
+                (path,)
+            )
+            load_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            updates = ", ".join(f"{column}=VALUES({column})" for column in columns if column != "URL")
+            cursor.execute(
+                f"INSERT INTO {table_name} ({', '.join(columns)}) SELECT {', '.join(columns)} FROM {staging_table(table_name)} "
+                f"ON DUPLICATE KEY UPDATE {updates}"
+            )
+            history_rows = 0
+            if history:
+                cursor.execute(f"""
+                INSERT IGNORE INTO {history_table(table_name)} (product_id, crawled_at, Price, Availability)
+                SELECT p.id, %s, s.Price, s.Availability
+                FROM {staging_table(table_name)} s
+                JOIN {table_name} p ON p.URL = s.URL
+                LEFT JOIN (
+                    SELECT h.product_id, h.Price, h.Availability
+                    FROM {history_table(table_name)} h
+                    JOIN (SELECT product_id, MAX(crawled_at) AS crawled_at FROM {history_table(table_name)} GROUP BY product_id) latest
+                        ON latest.product_id = h.product_id AND latest.crawled_at = h.crawled_at
+                ) last ON last.product_id = p.id
+                WHERE last.product_id IS NULL OR NOT (last.Price <=> s.Price AND last.Availability <=> s.Availability)
+                """, (crawled_at,))
+                history_rows = cursor.rowcount
+            connection.commit()
+            merge_time = time.perf_counter() - start
+            cursor.execute(f"DROP TEMPORARY TABLE IF EXISTS {staging_table(table_name)}")
+    finally:
+        os.remove(path)
+
+    print(f"Bulk load of {loaded} rows: file {file_time:.2f} s, LOAD DATA {load_time:.2f} s, merge {merge_time:.2f} s")
+    if history:
+        print(f"{history_rows} changes of price or availability were added to '{history_table(table_name)}'")
+    return loaded
+
+# Connection pools, one per server, user, database and size. They live as long as the process,
+# so the connections are reused by every store_rows_in_mysql / load_listing_hashes call.
+connection_pools = {}
+connection_pools_lock = threading.Lock()
+
+# The main connection and every writer hold a connection at the same time, and the get_connection of the pool does not
+# wait for a free one (it raises PoolError), so a smaller "pool_size" is raised to that. The connector allows at most 32.
+def get_pool_size(db_config):
+    writer_threads = db_config.get('writer_threads', default_writer_threads)
+    size = max(db_config.get('pool_size') or 0, writer_threads + 1)
+    if size > mysql.connector.pooling.CNX_POOL_MAXSIZE:
+        raise ValueError(
+            f"A connection pool of {size} connections (\"pool_size\" {db_config.get('pool_size')}, \"writer_threads\" {writer_threads}) "
+            f"is more than the {mysql.connector.pooling.CNX_POOL_MAXSIZE} that mysql-connector allows. Lower \"pool_size\" or \"writer_threads\"."
         )
+    return size
+
+def get_connection_pool(db_config):
+    key = (db_config['host'], db_config['user'], db_config['database'], get_pool_size(db_config))
+    with connection_pools_lock:
+        if key not in connection_pools:
+            connection_pools[key] = mysql.connector.pooling.MySQLConnectionPool(
+                pool_name=f"ntoulas_{len(connection_pools)}",
+                pool_size=get_pool_size(db_config),
+                host=db_config['host'],
+                user=db_config['user'],
+                password=db_config['password'],
+                database=db_config['database'],
+                allow_local_infile=db_config.get('write_mode', default_write_mode) == 'bulk'
+            )
+        return connection_pools[key]
+
+# A connection from the pool when the db_config asks for parallel writers or a pool, otherwise a new connection as before.
+# Closing a pooled connection gives it back to the pool.
+def connect_to_mysql(db_config):
+    if db_config.get('pool_size') or db_config.get('writer_threads', default_writer_threads) > 1:
+        return get_connection_pool(db_config).get_connection()
+    return mysql.connector.connect(
+        host=db_config['host'],
+        user=db_config['user'],
+        password=db_config['password'],
+        database=db_config['database'],
+        allow_local_infile=db_config.get('write_mode', default_write_mode) == 'bulk'
+    )
+
+# Create the product table if it doesn't exist, and add the columns that older versions of the table do not have.
+def create_product_table(cursor, table_name, schema=default_schema):
+    if schema == 'typed':
+        create_typed_product_table(cursor, table_name)
+        return
+    # Create a table if it doesn't exist
+    create_table_query = f"""
+    CREATE TABLE IF NOT EXISTS {table_name} (
+        id INT AUTO_INCREMENT PRIMARY KEY, 
+        HTML TEXT, 
+        Description TEXT, 
+        URL VARCHAR(2083),
+        Price VARCHAR(255),
+        Image_Info TEXT, 
+        Content_HTML LONGTEXT,
+        Source VARCHAR(255),
+        Title VARCHAR(255),
+        Availability VARCHAR(255),
+        Product_Code VARCHAR(255), 
+        Brand VARCHAR(255),
+        Listing_Hash CHAR(64),
+        HTML_Hash CHAR(64),
+        Content_HTML_Hash CHAR(64),
+        UNIQUE KEY unique_url (URL(255))
+    );
+    """
+    cursor.execute(create_table_query)
+    for column in ("Listing_Hash", "HTML_Hash", "Content_HTML_Hash"):
+        add_missing_column(cursor, table_name, column, "CHAR(64)")
+
+def add_missing_column(cursor, table_name, column, definition):
+    cursor.execute(
+        "SELECT COUNT(*) FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s",
+        (table_name, column)
+    )
+    if cursor.fetchone()[0] == 0:
+        cursor.execute(f"ALTER TABLE {table_name} ADD COLUMN {column} {definition}")
+
+# Read the listing hashes of the products that are already in the table, as {url: hash}.
+# This is what an incremental crawl compares against. If the table does not exist yet every product is new.
+def load_listing_hashes(table_name, db_config):
+    if db_config.get('backend', default_backend) == 'sqlite':
+        return load_listing_hashes_from_sqlite(table_name, db_config)
+    connection = None
+    try:
+        connection = connect_to_mysql(db_config)
+        cursor = connection.cursor()
+        create_product_table(cursor, table_name, db_config.get('schema', default_schema))
+        cursor.execute(f"SELECT URL, Listing_Hash FROM {table_name} WHERE Listing_Hash IS NOT NULL")
+        hashes = dict(cursor.fetchall())
+        cursor.close()
+        return hashes
+    except Error as e:
+        print(f"Error while reading the listing hashes from MySQL: {e}")
+        return {}
+    finally:
+        if connection is not None and connection.is_connected():
+            connection.close()
+
+# Store rows (tuples in the order of table_columns) in a MySQL database, or in SQLite with "backend": "sqlite".
+# The rows can come from a generator: they are consumed and written one batch at a time.
+def store_rows_in_mysql(rows, table_name, db_config):
+    if db_config.get('backend', default_backend) == 'sqlite':
+        store_rows_in_sqlite(rows, table_name, db_config)
+        return
+    connection = None
+    try:
+        connection = connect_to_mysql(db_config)
 
         # Create a cursor to parse the table
         if connection.is_connected():
             cursor = connection.cursor()
-
-            # Create a table if it doesn't exist
-            create_table_query = f"""
-            CREATE TABLE IF NOT EXISTS {table_name} (
-                id INT AUTO_INCREMENT PRIMARY KEY, 
-                HTML TEXT, 
-                Description TEXT, 
-                URL VARCHAR(2083),
-                Price VARCHAR(255),
-                Image_Info TEXT, 
-                Content_HTML LONGTEXT,
-                Source VARCHAR(255),
-                Title VARCHAR(255),
-                Availability VARCHAR(255),
-                Product_Code VARCHAR(255), 
-                Brand VARCHAR(255),
-                UNIQUE KEY unique_url (URL(255))
-            );
-            """
-            cursor.execute(create_table_query)
+            create_product_table(cursor, table_name, db_config.get('schema', default_schema))
+            html_storage = db_config.get('html_storage', default_html_storage)
+            if html_storage == 'blobs':
+                create_html_blob_table(cursor, table_name)
+            # Every row of the history that this run adds gets the same timestamp, the start of the run.
+            crawled_at = datetime.now().replace(microsecond=0)
+            if db_config.get('history'):
+                create_history_table(cursor, table_name, db_config.get('schema', default_schema), crawled_at)
 
             # Update or enter new data in the table
-            for _, row in data.iterrows():
-                insert_update_query = f"""
-                INSERT INTO {table_name} (HTML, Description, URL, Price, Image_Info, Content_HTML, Source, Title, Availability, Product_Code, Brand)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                ON DUPLICATE KEY UPDATE
-                    HTML=VALUES(HTML),
-                    Description=VALUES(Description),
-                    Price=VALUES(Price),
-                    Image_Info=VALUES(Image_Info),
-                    Content_HTML=VALUES(Content_HTML),
-                    Source=VALUES(Source),
-                    Title=VALUES(Title),
-                    Availability=VALUES(Availability), 
-                    Product_Code=VALUES(Product_Code), 
-                    Brand=VALUES(Brand);
-                """
-                
-                # Convert BeautifulSoup objects to strings in order to be able to store them the MySQL base
-                row = row.apply(lambda x: str(x) if isinstance(x, BeautifulSoup) else x)  
-                cursor.execute(insert_update_query, tuple(row))
-
-            connection.commit() 
+            start = time.perf_counter()
+            writer_threads = db_config.get('writer_threads', default_writer_threads)
+            if db_config.get('write_mode', default_write_mode) == 'bulk':
+                written = bulk_load_rows(
+                    connection, cursor, rows, table_name, db_config.get('batch_size', default_batch_size),
+                    html_storage, db_config.get('html_compression', default_html_compression), db_config.get('schema', default_schema),
+                    db_config.get('history', False), crawled_at
+                )
+            elif writer_threads > 1:
+                written = write_rows_in_parallel(
+                    db_config, rows, table_name, db_config.get('batch_size', default_batch_size), get_batch_byte_limit(cursor), writer_threads,
+                    html_storage, db_config.get('html_compression', default_html_compression), db_config.get('schema', default_schema),
+                    db_config.get('history', False), crawled_at
+                )
+            else:
+                written = write_rows_in_batches(
+                    connection, cursor, rows, table_name, db_config.get('batch_size', default_batch_size),
+                    html_storage, db_config.get('html_compression', default_html_compression), db_config.get('schema', default_schema),
+                    db_config.get('history', False), crawled_at
+                )
+            elapsed = time.perf_counter() - start
+
             print(f"Data has been stored in the table '{table_name}' in the database.")
+            print(f"{written} rows in {elapsed:.2f} seconds ({written / elapsed if elapsed else 0:.0f} rows/second)")
 
     except Error as e:
         print(f"Error while connecting to MySQL: {e}")
 
     finally:
-        if connection.is_connected():
+        if connection is not None and connection.is_connected():
             cursor.close()
             connection.close()
             print("MySQL connection is closed")
 
-if __name__ == "__main__":
-    # We set dictionaries as we thought it make it easier to expand the code in the future if more shops are to be added.
-    # These dictionaries contain the tags that are being used to locate the products info we wanted.
-    # Some of these info are located in the PLP (generic page) and some of them in the PDP (product page)
-    # "fetch_product_destription_with_selenium" fuction takes 2 urls as parameters, here it is becoming even more clear.
-    # He have a base and PLP url for every shop.
-    
-    url1 = "https://www.e-dructer.com/mikrosiskeves/skoupes/skoupakia/"
-    base_url1 = "https://www.e-dructer.com"
-    
-    config1 = {
-        "product_list": "div.grid-list div.ty-grid-list__item",
-        "description": "div.ty-grid-list__item-name",
-        "price": "span.ty-price-num",
-        "image": "img.ty-pict", 
-        "brand": "strong.brando",
-        "site": "e-druster",
-        "product_page": {
-            "title": "h1.ty-product-block-title",
-            "description": "div.perigrafi_gar",
-            "availability": "span[style*='font-size:11px;display:inline-block;color:green;margin-left: -5px;margin-top: 5px']",
-            "product_code": "span.ty-control-group__item"
-        }
-    }
-    
-    url2 = "https://cosmomarket.gr/c/005423910436/Ilektrikes_Skoupes.html"
-    base_url2 = "https://cosmomarket.gr"
-    
-    config2 = {
-        "product_list": "div.col-6.col-md-4.col-xl-3",
-        "description": "h2.product-title",
-        "price": "span.product-price",
-        "image": "img",
-        "site": "cosmomarket",
-        "product_page": {
-            "title": "h1.product-title", 
-            "description": "div.product-desc-content",
-            "availability": "div.category-list[style*='font-size: 1.3rem;margin-bottom:10px;']",
-            "product_code": "div.category-list[style*='font-size: 1.3rem;']"
-        }
-    }
-    
-    url3 = "https://www.cookshop.gr/el/catalog/%CF%83%CE%BA%CE%B5%CF%85%CE%B7-%CE%BC%CE%B1%CE%B3%CE%B5%CE%B9%CF%81%CE%B9%CE%BA%CE%B7%CF%83-%CF%84%CE%B7%CE%B3%CE%B1%CE%BD%CE%B9%CE%B1?fbclid=IwZXh0bgNhZW0CMTAAAR2DIGFZexilB07-KwRSMuPWp_NcOymif4X85_aqCUqyevz6nb72V9-JiGk_aem_AVQPsqR5BIQ0gaO-1JPFc4EfJChrYciD_Lb-iNNXCkXeeY4bcBggV5ResWqTtIocVxfomGYw-R3KE7Ul_I9gCTsr" 
-    base_url3 = "https://www.cookshop.gr"
-    
-    config3 = {
-        "product_list": "ul.product-list div.gya-product",
-        "description": "div.description",
-        "price": "div.price", 
-        "image": "img",
-        "site": "cookshop", 
-        "product_page": {
-            "title": "h1.page-title.center",
-            "description": "div.tab.active-now#group-0",
-            "availability": "span.avail",
-            "product_code": "span.code"
-        },
-        "brand": "div.brand-title"
-    }
+# Store data in a MySQL database
+def store_data_in_mysql(data, table_name, db_config):
+    data = data.reindex(columns=product_columns) # A DataFrame without the newer columns (e.g. "Listing Hash") gets them empty.
+    store_rows_in_mysql((to_table_row(row) for row in data.itertuples(index=False, name=None)), table_name, db_config)
+
+# Store products in MySQL while they are still being produced.
+# "products" can be any iterable of product dictionaries, for example the generators of iter_product_info.
+# A batch is written and committed as soon as it is full, so the memory use stays flat
+# and the data is in the database while the crawl is still running.
+def stream_products_to_mysql(products, table_name, db_config):
+    store_rows_in_mysql((to_table_row(product[column] for column in product_columns) for product in products), table_name, db_config)
 
-    url4 = "https://www.cookshop.gr/el/catalog/%CE%B7%CE%BB%CE%B5%CE%BA%CF%84%CF%81%CE%B9%CE%BA%CE%B5%CF%83-%CE%BC%CE%B9%CE%BA%CF%81%CE%BF%CF%83%CF%85%CF%83%CE%BA%CE%B5%CF%85%CE%B5%CF%83-air?fbclid=IwZXh0bgNhZW0CMTAAAR0mQLgxj3npDbsytVytAc8fwX6D307Yu7jGSGXQ-EvpUT6cSSQujs68nCk_aem_AV7JIfZ04Y8EsR-2WULoAgrj2hYMX_WSSiG_iYz7hGsAdY5SeX-zJ3gk4uRrf7EJY0TEuE0Uh9ajEXisjCY4J6tT"
-    base_url4 = "https://www.cookshop.gr"
-
-    config4 = {
-        "product_list": "ul.product-list div.gya-product",
-        "description": "div.description",
-        "price": "div.price",
-        "image": "img",
-        "site": "cookshop",
-        "product_page": {
-            "title": "h1.page-title.center",
-            "description": "div.tab.active-now#group-0",
-            "availability": "span.avail",
-            "product_code": "span.code"
-        },
-        "brand": "div.brand-title"
+# SQLite backend.
+# With "backend": "sqlite" in the db_config the products are stored in the SQLite file "sqlite_path" instead of MySQL,
+# so dev boxes, CI and small deployments do not need a server. The tables are the same as in MySQL: the product table
+# with one row per URL (the upsert is INSERT ... ON CONFLICT(URL) DO UPDATE), the HTML blob table, and the history with
+# its <table>_latest view (without the monthly partitions). The database is in WAL mode, so it can be read while a crawl
+# writes to it, and every batch is one transaction in which executemany runs one prepared upsert for all the rows.
+# SQLite has one writer at a time, so "writer_threads" and "write_mode" are not used here.
+default_backend = 'mysql'
+default_sqlite_path = 'ntoulasBase.sqlite3'
+
+# The Decimal prices of the typed schema go into a NUMERIC column, which stores them as numbers.
+sqlite3.register_adapter(Decimal, str)
+
+def connect_to_sqlite(db_config):
+    connection = sqlite3.connect(db_config.get('sqlite_path', default_sqlite_path), timeout=30)
+    connection.execute("PRAGMA journal_mode=WAL")
+    # With WAL a commit does not wait for the disk. A crash can lose the last transactions, but not corrupt the file.
+    connection.execute("PRAGMA synchronous=NORMAL")
+    return connection
+
+def create_sqlite_product_table(connection, table_name, schema=default_schema):
+    typed = schema == 'typed'
+    availability_values_list = ", ".join(f"'{value}'" for value in availability_values)
+    connection.execute(f"""
+    CREATE TABLE IF NOT EXISTS {table_name} (
+        id INTEGER PRIMARY KEY,
+        HTML TEXT,
+        Description TEXT,
+        URL TEXT UNIQUE,
+        Price {"NUMERIC" if typed else "TEXT"},
+        Image_Info TEXT,
+        Content_HTML TEXT,
+        Source TEXT,
+        Title TEXT,
+        Availability TEXT{f" CHECK (Availability IN ({availability_values_list}))" if typed else ""},
+        Product_Code TEXT,
+        Brand TEXT,
+        Listing_Hash TEXT,
+        HTML_Hash TEXT,
+        {"Content_HTML_Hash TEXT, Currency TEXT, Availability_Text TEXT" if typed else "Content_HTML_Hash TEXT"}
+    )
+    """)
+    if typed:
+        price_type = next(row[2] for row in connection.execute(f"PRAGMA table_info({table_name})") if row[1] == "Price")
+        if price_type != "NUMERIC":
+            raise ValueError(f"The table '{table_name}' has the text schema. Use another table name for the typed schema.")
+        connection.execute(f"CREATE INDEX IF NOT EXISTS {table_name}_source_price ON {table_name} (Source, Price)")
+        connection.execute(f"CREATE INDEX IF NOT EXISTS {table_name}_price ON {table_name} (Price)")
+        connection.execute(f"CREATE INDEX IF NOT EXISTS {table_name}_product_code ON {table_name} (Product_Code)")
+
+def create_sqlite_html_blob_table(connection, table_name):
+    connection.execute(f"""
+    CREATE TABLE IF NOT EXISTS {html_blob_table(table_name)} (
+        Hash TEXT PRIMARY KEY,
+        Compression TEXT NOT NULL,
+        Size INTEGER NOT NULL,
+        Data BLOB NOT NULL
+    ) WITHOUT ROWID
+    """)
+
+def create_sqlite_history_table(connection, table_name, schema):
+    price_type = "NUMERIC" if schema == 'typed' else "TEXT"
+    connection.execute(f"""
+    CREATE TABLE IF NOT EXISTS {history_table(table_name)} (
+        product_id INTEGER NOT NULL,
+        crawled_at TEXT NOT NULL,
+        Price {price_type},
+        Availability TEXT,
+        PRIMARY KEY (product_id, crawled_at)
+    ) WITHOUT ROWID
+    """)
+    connection.execute(f"""
+    CREATE VIEW IF NOT EXISTS {latest_history_view(table_name)} AS
+    SELECT h.product_id, p.URL, p.Source, p.Title, h.crawled_at, h.Price, h.Availability
+    FROM {history_table(table_name)} h
+    JOIN (SELECT product_id, MAX(crawled_at) AS crawled_at FROM {history_table(table_name)} GROUP BY product_id) latest
+        ON latest.product_id = h.product_id AND latest.crawled_at = h.crawled_at
+    JOIN {table_name} p ON p.id = h.product_id
+    """)
+
+def build_sqlite_upsert_query(table_name, columns=table_columns):
+    updates = ",\n    ".join(f"{column}=excluded.{column}" for column in columns if column != "URL")
+    return (
+        f"INSERT INTO {table_name} ({', '.join(columns)})\n"
+        f"VALUES ({', '.join(['?'] * len(columns))})\n"
+        f"ON CONFLICT(URL) DO UPDATE SET\n    {updates}"
+    )
+
+# store_html for SQLite.
+def store_html_in_sqlite(connection, table_name, batch, html_storage, compression):
+    rows, blobs = hash_html_columns(batch, html_storage)
+    if blobs:
+        existing = connection.execute(f"SELECT Hash FROM {html_blob_table(table_name)} WHERE Hash IN ({', '.join(['?'] * len(blobs))})", list(blobs))
+        for (digest,) in existing.fetchall():
+            del blobs[digest]
+    if blobs:
+        connection.executemany(
+            f"INSERT OR IGNORE INTO {html_blob_table(table_name)} (Hash, Compression, Size, Data) VALUES (?, ?, ?, ?)",
+            [(digest, compression, len(html.encode('utf-8')), compress_html(html, compression)) for digest, html in blobs.items()]
+        )
+    return rows
+
+# record_history for SQLite. The comparison with the last history row of every product is done in SQL,
+# so a typed price is compared as a number with the stored one. Returns the number of rows that were added.
+def record_history_in_sqlite(connection, table_name, batch, columns, crawled_at):
+    url_column = columns.index("URL")
+    price_column = columns.index("Price")
+    availability_column = columns.index("Availability")
+    cursor = connection.executemany(f"""
+    INSERT OR IGNORE INTO {history_table(table_name)} (product_id, crawled_at, Price, Availability)
+    SELECT p.id, :crawled_at, :price, :availability
+    FROM {table_name} p
+    WHERE p.URL = :url AND NOT EXISTS (
+        SELECT 1 FROM {history_table(table_name)} h
+        WHERE h.product_id = p.id AND h.Price IS :price AND h.Availability IS :availability
+          AND h.crawled_at = (SELECT MAX(crawled_at) FROM {history_table(table_name)} WHERE product_id = p.id)
+    )
+    """, [
+        {"crawled_at": crawled_at, "price": row[price_column], "availability": row[availability_column], "url": row[url_column]}
+        for row in batch
+    ])
+    return cursor.rowcount
+
+# Write the rows in batches, one transaction per batch. Returns the number of rows that were written.
+def write_rows_to_sqlite(connection, rows, table_name, batch_size, html_storage=default_html_storage, html_compression=default_html_compression, schema=default_schema, history=False, crawled_at=None):
+    columns = typed_table_columns if schema == 'typed' else table_columns
+    query = build_sqlite_upsert_query(table_name, columns)
+    crawled_at = (crawled_at or datetime.now()).replace(microsecond=0).isoformat(' ')
+    written = 0
+    history_rows = 0
+    # SQLite has no max_allowed_packet, the batches are only limited by their number of rows.
+    for batch in split_into_batches(prepare_rows(rows, schema), batch_size, float('inf')):
+        with measure('db_write', table_name) as measurement:
+            batch = store_html_in_sqlite(connection, table_name, batch, html_storage, html_compression)
+            if schema == 'typed':
+                batch = [to_typed_row(row) for row in batch]
+            measurement["bytes"] = sum(row_size(row) for row in batch)
+            connection.executemany(query, batch)
+            if history:
+                history_rows += record_history_in_sqlite(connection, table_name, batch, columns, crawled_at)
+            connection.commit()
+        written += len(batch)
+    if history:
+        print(f"{history_rows} changes of price or availability were added to '{history_table(table_name)}'")
+    return written
+
+# store_rows_in_mysql for SQLite.
+def store_rows_in_sqlite(rows, table_name, db_config):
+    connection = None
+    try:
+        connection = connect_to_sqlite(db_config)
+        schema = db_config.get('schema', default_schema)
+        create_sqlite_product_table(connection, table_name, schema)
+        html_storage = db_config.get('html_storage', default_html_storage)
+        if html_storage == 'blobs':
+            create_sqlite_html_blob_table(connection, table_name)
+        if db_config.get('history'):
+            create_sqlite_history_table(connection, table_name, schema)
+        connection.commit()
+
+        start = time.perf_counter()
+        written = write_rows_to_sqlite(
+            connection, rows, table_name, db_config.get('batch_size', default_batch_size),
+            html_storage, db_config.get('html_compression', default_html_compression), schema,
+            db_config.get('history', False), datetime.now()
+        )
+        elapsed = time.perf_counter() - start
+
+        print(f"Data has been stored in the table '{table_name}' of {db_config.get('sqlite_path', default_sqlite_path)}.")
+        print(f"{written} rows in {elapsed:.2f} seconds ({written / elapsed if elapsed else 0:.0f} rows/second)")
+
+    except sqlite3.Error as e:
+        print(f"Error while writing to SQLite: {e}")
+
+    finally:
+        if connection is not None:
+            connection.close()
+
+# load_listing_hashes for SQLite.
+def load_listing_hashes_from_sqlite(table_name, db_config):
+    connection = None
+    try:
+        connection = connect_to_sqlite(db_config)
+        create_sqlite_product_table(connection, table_name, db_config.get('schema', default_schema))
+        connection.commit()
+        return dict(connection.execute(f"SELECT URL, Listing_Hash FROM {table_name} WHERE Listing_Hash IS NOT NULL"))
+    except sqlite3.Error as e:
+        print(f"Error while reading the listing hashes from SQLite: {e}")
+        return {}
+    finally:
+        if connection is not None:
+            connection.close()
+
+# Parquet export, for analytics over many runs (pip install pyarrow).
+# The products of a run are written to a Parquet dataset in parquet_directory, partitioned by shop and crawl date:
+#   products/shop=e-dructer.com/crawl_date=2026-10-18/part-<time>.parquet
+#   html/shop=e-dructer.com/crawl_date=2026-10-18/part-<time>.parquet   (URL + the HTML columns, when split_html is on)
+# Every run adds its own part file to the partitions it writes and never removes the files of earlier runs, so a shop that is
+# crawled twice in a day has both crawls in that day (they can be told apart by "part-<time>"). The export is only complete
+# with a full crawl: an incremental crawl gives only the new or changed products, so the main block turns incremental off
+# when parquet_export is on.
+# The columns with few distinct values are dictionary encoded, and the price is also stored parsed ("Price Value", "Currency").
+# load_parquet_products reads only the partitions and columns that are asked for.
+parquet_directory = 'parquet'
+parquet_chunk_rows = 5000 # rows that are kept in memory per shop before they are written as a row group
+parquet_html_columns = ["HTML", "Content HTML"]
+parquet_dictionary_columns = ["Source", "Availability", "Brand", "Currency"]
+
+def parquet_schema(columns):
+    import pyarrow as pa
+    fields = []
+    for column in columns:
+        if column == "Price Value":
+            fields.append(pa.field(column, pa.decimal128(10, 2)))
+        elif column in parquet_dictionary_columns:
+            fields.append(pa.field(column, pa.dictionary(pa.int32(), pa.string())))
+        else:
+            fields.append(pa.field(column, pa.string()))
+    return pa.schema(fields)
+
+def parquet_partitioning():
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    return ds.partitioning(pa.schema([("shop", pa.string()), ("crawl_date", pa.date32())]), flavor="hive")
+
+# Name of the shop partition: the host of the Source url, without "www." and with the characters that windows does not allow in folder names replaced.
+def shop_name(source):
+    host = urlparse(str(source)).netloc or str(source)
+    host = host[4:] if host.startswith("www.") else host
+    return re.sub(r'[<>:"/\\|?*]', '_', host)
+
+# Writes products into the dataset as they come, with one open file per (dataset, shop) of the run.
+class ParquetExport:
+    def __init__(self, directory=parquet_directory, crawl_date=None, split_html=True):
+        self.directory = directory
+        self.crawl_date = crawl_date or date.today()
+        self.split_html = split_html
+        self.name = f"part-{datetime.now().strftime('%H%M%S')}-{os.getpid()}-{uuid.uuid4().hex[:8]}.parquet"
+        product_columns_out = [column for column in product_columns if not (split_html and column in parquet_html_columns)]
+        self.columns = {"products": product_columns_out + ["Price Value", "Currency"]}
+        if split_html:
+            self.columns["html"] = ["URL"] + parquet_html_columns
+        self.buffers = {}
+        self.writers = {}
+        self.rows = 0
+
+    def add(self, product):
+        price, currency = parse_price(product.get("Price"))
+        row = dict(product, **{"Price Value": price, "Currency": currency})
+        shop = shop_name(product.get("Source"))
+        buffer = self.buffers.setdefault(shop, [])
+        buffer.append(row)
+        self.rows += 1
+        if len(buffer) >= parquet_chunk_rows:
+            self.flush(shop)
+
+    def writer(self, dataset, shop):
+        import pyarrow.parquet as pq
+        key = (dataset, shop)
+        if key not in self.writers:
+            partition = os.path.join(self.directory, dataset, f"shop={shop}", f"crawl_date={self.crawl_date.isoformat()}")
+            os.makedirs(partition, exist_ok=True)
+            dictionary_columns = [column for column in self.columns[dataset] if column in parquet_dictionary_columns]
+            self.writers[key] = pq.ParquetWriter(
+                os.path.join(partition, self.name), parquet_schema(self.columns[dataset]),
+                compression='zstd', use_dictionary=dictionary_columns or False
+            )
+        return self.writers[key]
+
+    def flush(self, shop):
+        import pyarrow as pa
+        rows = self.buffers.pop(shop, [])
+        if not rows:
+            return
+        for dataset, columns in self.columns.items():
+            schema = parquet_schema(columns)
+            arrays = []
+            for field in schema:
+                values = [row.get(field.name) for row in rows]
+                # Failed fields of a DataFrame are NaN, and the parquet file wants them as nulls.
+                values = [None if isinstance(value, float) and value != value else value for value in values]
+                if field.name != "Price Value":
+                    values = [None if value is None else str(value) for value in values]
+                arrays.append(pa.array(values, type=field.type))
+            self.writer(dataset, shop).write_table(pa.Table.from_arrays(arrays, schema=schema))
+
+    def close(self):
+        for shop in list(self.buffers):
+            self.flush(shop)
+        for writer in self.writers.values():
+            writer.close()
+        self.writers = {}
+        print(f"{self.rows} products have been exported to the Parquet dataset in '{self.directory}'")
+
+# Export products (a DataFrame or any iterable of product dictionaries) to the Parquet dataset.
+def export_products_to_parquet(products, directory=parquet_directory, crawl_date=None, split_html=True):
+    if isinstance(products, pd.DataFrame):
+        products = products.reindex(columns=product_columns).to_dict("records")
+    export = ParquetExport(directory, crawl_date, split_html)
+    try:
+        for product in products:
+            export.add(product)
+    finally:
+        export.close()
+
+# Pass the products through unchanged while writing them to the Parquet dataset, for the streaming mode.
+def tee_products_to_parquet(products, directory=parquet_directory, crawl_date=None, split_html=True):
+    export = ParquetExport(directory, crawl_date, split_html)
+    try:
+        for product in products:
+            export.add(product)
+            yield product
+    finally:
+        export.close()
+
+# Load products from the Parquet dataset as a DataFrame.
+# Only the partitions of the given shops and dates are opened and only the given columns are read; "Price Value" filters use
+# the statistics of the row groups. For example a month of prices:
+#   load_parquet_products(start_date=date(2026, 10, 1), end_date=date(2026, 10, 31), columns=["URL", "Price Value"])
+def load_parquet_products(directory=parquet_directory, shops=None, start_date=None, end_date=None, min_price=None, max_price=None, columns=None, dataset="products"):
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    parquet_dataset = ds.dataset(os.path.join(directory, dataset), format="parquet", partitioning=parquet_partitioning())
+    conditions = []
+    if shops:
+        conditions.append(ds.field("shop").isin(shops))
+    if start_date:
+        conditions.append(ds.field("crawl_date") >= start_date)
+    if end_date:
+        conditions.append(ds.field("crawl_date") <= end_date)
+    if min_price is not None:
+        conditions.append(ds.field("Price Value") >= pa.scalar(Decimal(str(min_price)), pa.decimal128(10, 2)))
+    if max_price is not None:
+        conditions.append(ds.field("Price Value") <= pa.scalar(Decimal(str(max_price)), pa.decimal128(10, 2)))
+    condition = None
+    for part in conditions:
+        condition = part if condition is None else condition & part
+    return parquet_dataset.to_table(columns=columns, filter=condition).to_pandas()
+
+# We set dictionaries as we thought it make it easier to expand the code in the future if more shops are to be added.
+# These dictionaries contain the tags that are being used to locate the products info we wanted.
+# Some of these info are located in the PLP (generic page) and some of them in the PDP (product page)
+# "fetch_product_destription_with_selenium" fuction takes 2 urls as parameters, here it is becoming even more clear.
+# He have a base and PLP url for every shop.
+
+url1 = "https://www.e-dructer.com/mikrosiskeves/skoupes/skoupakia/"
+base_url1 = "https://www.e-dructer.com"
+
+config1 = {
+    "product_list": "div.grid-list div.ty-grid-list__item",
+    "description": "div.ty-grid-list__item-name",
+    "price": "span.ty-price-num",
+    "image": "img.ty-pict", 
+    "brand": "strong.brando",
+    "site": "e-druster",
+    "pagination": {
+        "page_links": "div.ty-pagination a.ty-pagination__item",
+        "next_link": "div.ty-pagination a.ty-pagination__next"
+    },
+    "product_page": {
+        "title": "h1.ty-product-block-title",
+        "description": "div.perigrafi_gar",
+        "availability": "span[style*='font-size:11px;display:inline-block;color:green;margin-left: -5px;margin-top: 5px']",
+        "product_code": "span.ty-control-group__item"
     }
-    
-    url5 = "https://www.e-dructer.com/mikrosiskeves/proino/kafetieres/?features_hash=85-2661&fbclid=IwZXh0bgNhZW0CMTAAAR06GMq-yoXfUqzND_7X4ZZ5Icf6NiH10Dpf9npODGuItwSlon0qI1dwxQA_aem_AV6RNN3-q4Z7ZeRrxUIVMrNzZrW3NV2PF5ctMOi3cJXm_8cvQ5Fd4IoxCTUNDp95tXJyrhDpn_q4QHXavo9RZjAS"
-    base_url5 = "https://www.e-dructer.com"
-    
-    config5 = {
-        "product_list": "div.grid-list div.ty-grid-list__item",
-        "description": "div.ty-grid-list__item-name",
-        "price": "span.ty-price-num",
-        "image": "img.ty-pict", 
-        "brand": "strong.brando",
-        "site": "e-druster",
-        "product_page": {
-            "title": "h1.ty-product-block-title",
-            "description": "div.perigrafi_gar",
-            "availability": "span[style*='font-size:11px;display:inline-block;color:green;margin-left: -5px;margin-top: 5px']",
-            "product_code": "span.ty-control-group__item"
-        }
+}
+
+url2 = "https://cosmomarket.gr/c/005423910436/Ilektrikes_Skoupes.html"
+base_url2 = "https://cosmomarket.gr"
+
+config2 = {
+    "product_list": "div.col-6.col-md-4.col-xl-3",
+    "description": "h2.product-title",
+    "price": "span.product-price",
+    "image": "img",
+    "site": "cosmomarket",
+    "product_page": {
+        "title": "h1.product-title", 
+        "description": "div.product-desc-content",
+        "availability": "div.category-list[style*='font-size: 1.3rem;margin-bottom:10px;']",
+        "product_code": "div.category-list[style*='font-size: 1.3rem;']"
     }
+}
 
-    # Here we set the "final" dataFrame that will be feeded by all the pages. 
-    all_products = pd.DataFrame(columns=["HTML", "Description", "URL", "Price", "Image Info", "Content HTML", "Source", "Title", "Availability", "Product Code", "Brand"]) 
-    
-    product_info1 = extract_product_info(url1, base_url1, config1)
-    all_products = pd.concat([all_products, product_info1], ignore_index=True)
-    
-    product_info2 = extract_product_info(url2, base_url2, config2)
-    all_products = pd.concat([all_products, product_info2], ignore_index=True)
-    
-    product_info3 = extract_product_info(url3, base_url3, config3)
-    all_products = pd.concat([all_products, product_info3], ignore_index=True)
+url3 = "https://www.cookshop.gr/el/catalog/%CF%83%CE%BA%CE%B5%CF%85%CE%B7-%CE%BC%CE%B1%CE%B3%CE%B5%CE%B9%CF%81%CE%B9%CE%BA%CE%B7%CF%83-%CF%84%CE%B7%CE%B3%CE%B1%CE%BD%CE%B9%CE%B1?fbclid=IwZXh0bgNhZW0CMTAAAR2DIGFZexilB07-KwRSMuPWp_NcOymif4X85_aqCUqyevz6nb72V9-JiGk_aem_AVQPsqR5BIQ0gaO-1JPFc4EfJChrYciD_Lb-iNNXCkXeeY4bcBggV5ResWqTtIocVxfomGYw-R3KE7Ul_I9gCTsr" 
+base_url3 = "https://www.cookshop.gr"
+
+config3 = {
+    "product_list": "ul.product-list div.gya-product",
+    "description": "div.description",
+    "price": "div.price", 
+    "image": "img",
+    "site": "cookshop", 
+    "render": "auto", # only the description tab needs javascript, the rest is in the static HTML
+    "product_page": {
+        "title": "h1.page-title.center",
+        "description": "div.tab.active-now#group-0",
+        "availability": "span.avail",
+        "product_code": "span.code"
+    },
+    "brand": "div.brand-title"
+}
+
+url4 = "https://www.cookshop.gr/el/catalog/%CE%B7%CE%BB%CE%B5%CE%BA%CF%84%CF%81%CE%B9%CE%BA%CE%B5%CF%83-%CE%BC%CE%B9%CE%BA%CF%81%CE%BF%CF%83%CF%85%CF%83%CE%BA%CE%B5%CF%85%CE%B5%CF%83-air?fbclid=IwZXh0bgNhZW0CMTAAAR0mQLgxj3npDbsytVytAc8fwX6D307Yu7jGSGXQ-EvpUT6cSSQujs68nCk_aem_AV7JIfZ04Y8EsR-2WULoAgrj2hYMX_WSSiG_iYz7hGsAdY5SeX-zJ3gk4uRrf7EJY0TEuE0Uh9ajEXisjCY4J6tT"
+base_url4 = "https://www.cookshop.gr"
 
-    product_info4 = extract_product_info(url4, base_url4, config4)
-    all_products = pd.concat([all_products, product_info4], ignore_index=True)
+config4 = {
+    "product_list": "ul.product-list div.gya-product",
+    "description": "div.description",
+    "price": "div.price",
+    "image": "img",
+    "site": "cookshop",
+    "render": "auto", # only the description tab needs javascript, the rest is in the static HTML
+    "product_page": {
+        "title": "h1.page-title.center",
+        "description": "div.tab.active-now#group-0",
+        "availability": "span.avail",
+        "product_code": "span.code"
+    },
+    "brand": "div.brand-title"
+}
 
-    product_info5 = extract_product_info(url5, base_url5, config5)
-    all_products = pd.concat([all_products, product_info5], ignore_index=True)
+url5 = "https://www.e-dructer.com/mikrosiskeves/proino/kafetieres/?features_hash=85-2661&fbclid=IwZXh0bgNhZW0CMTAAAR06GMq-yoXfUqzND_7X4ZZ5Icf6NiH10Dpf9npODGuItwSlon0qI1dwxQA_aem_AV6RNN3-q4Z7ZeRrxUIVMrNzZrW3NV2PF5ctMOi3cJXm_8cvQ5Fd4IoxCTUNDp95tXJyrhDpn_q4QHXavo9RZjAS"
+base_url5 = "https://www.e-dructer.com"
+
+config5 = {
+    "product_list": "div.grid-list div.ty-grid-list__item",
+    "description": "div.ty-grid-list__item-name",
+    "price": "span.ty-price-num",
+    "image": "img.ty-pict", 
+    "brand": "strong.brando",
+    "site": "e-druster",
+    "pagination": {
+        "page_links": "div.ty-pagination a.ty-pagination__item",
+        "next_link": "div.ty-pagination a.ty-pagination__next"
+    },
+    "product_page": {
+        "title": "h1.ty-product-block-title",
+        "description": "div.perigrafi_gar",
+        "availability": "span[style*='font-size:11px;display:inline-block;color:green;margin-left: -5px;margin-top: 5px']",
+        "product_code": "span.ty-control-group__item"
+    }
+}
 
+# Every (PLP url, base url, config) triple that a run goes through.
+site_jobs = [
+    (url1, base_url1, config1),
+    (url2, base_url2, config2),
+    (url3, base_url3, config3),
+    (url4, base_url4, config4),
+    (url5, base_url5, config5)
+]
+
+# Compile the selectors of the site configs when the module is loaded (see SelectorPlan).
+for _, _, site_config in site_jobs:
+    get_selector_plan(site_config)
+
+if __name__ == "__main__":
     # Database credentials
     db_config = {
+        "backend": "mysql", # "sqlite" stores everything in the file "sqlite_path", without a MySQL server
+        "sqlite_path": "ntoulasBase.sqlite3",
         "host": "localhost",
         "user": "root",
         "password": "admin",
-        "database": "ntoulasBase"
+        "database": "ntoulasBase",
+        "batch_size": 200, # rows per INSERT statement and per transaction
+        "html_storage": "blobs", # "inline" keeps the HTML in the product table, "blobs" stores every distinct page once, compressed
+        "html_compression": "zlib",
+        "schema": "text", # "typed" stores parsed prices, normalized availability and NULLs, in its own table (see default_schema)
+        "history": True, # keep every change of price and availability in product_data_history
+        "writer_threads": 4, # batches are written by this many threads, with pooled connections
+        "write_mode": "batches" # "bulk" loads the whole crawl with LOAD DATA LOCAL INFILE, for full re-crawls
     }
     
     table_name = "product_data"
 
-    # Final command to in order to store all the data in the database.
-    store_data_in_mysql(all_products, table_name, db_config)
+    # How the site jobs are run:
+    # "streaming": one site after the other, and every batch of products is written to the database as soon as it is ready.
+    # "processes": the sites are crawled in parallel processes and the merged products are stored at the end.
+    # "sequential": one site after the other, the whole crawl is collected in one DataFrame and stored at the end.
+    run_mode = "streaming"
+
+    # Also write the products of the run to the Parquet dataset in parquet_directory (needs pyarrow).
+    parquet_export = False
+
+    # Keep a WARC copy of every page of the crawl ("record"), or run the crawl from those copies without the network ("replay").
+    # It is also given to the worker processes of run_mode "processes".
+    archive_mode = None
+
+    # With an incremental crawl only the products that are new or changed in the PLP since the last run are fetched and stored.
+    incremental = True
+    if incremental and parquet_export:
+        # The daily partitions of the Parquet dataset need every product, not only the changed ones.
+        print("The Parquet export needs a full crawl, so this run is not incremental.")
+        incremental = False
+    known_hashes = load_listing_hashes(table_name, db_config) if incremental else None
+
+    if run_mode == "streaming":
+        all_products = itertools.chain.from_iterable(iter_product_info(url, base_url, config, known_hashes) for url, base_url, config in site_jobs)
+        if parquet_export:
+            all_products = tee_products_to_parquet(all_products)
+        stream_products_to_mysql(all_products, table_name, db_config)
+    elif run_mode == "processes":
+        all_products = run_site_jobs_in_processes(site_jobs, known_hashes=known_hashes)
+        store_data_in_mysql(all_products, table_name, db_config)
+        if parquet_export:
+            export_products_to_parquet(all_products)
+    else:
+        # Here we set the "final" dataFrame that will be feeded by all the pages. 
+        all_products = pd.concat([extract_product_info(url, base_url, config, known_hashes) for url, base_url, config in site_jobs], ignore_index=True)
+
+        # Final command to in order to store all the data in the database.
+        store_data_in_mysql(all_products, table_name, db_config)
+        if parquet_export:
+            export_products_to_parquet(all_products)
+
+    if http_cache is not None:
+        print(f"HTTP cache: {http_cache.stats}")
+    if warc_writer is not None:
+        print(f"WARC archive: {warc_writer.stats}")
+    if run_mode != "processes":
+        print_connection_stats()
+    print_metrics()
+    export_metrics()
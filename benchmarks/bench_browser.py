@@ -0,0 +1,63 @@
+# Render time of product pages with the "default" and the "lean" selenium profile (see create_driver).
+# Every profile starts one browser and renders the same pages with it, waiting for the description tag
+# exactly like the scraper does. The browser start-up is reported separately, because the pool pays it only once per driver.
+#
+# Usage: python benchmarks/bench_browser.py [product page url ...]
+# Without urls the first product pages of the cookshop categories are used. Needs chrome and the chromedriver of chromedriver_path.
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import M151_EcommerseProject as scraper
+
+pages_per_category = 5
+profiles = ["default", "lean"]
+
+def cookshop_product_urls():
+    urls = []
+    for url, base_url, config in scraper.site_jobs:
+        if config['site'] != 'cookshop':
+            continue
+        response = scraper.fetch_page(url)
+        if response is None or response.status_code != 200:
+            print(f"could not download {url}")
+            continue
+        parser = scraper.get_html_parser(config)
+        soup = parser.parse(scraper.decode_html(response.content))
+        for product in parser.select(soup, config['product_list'])[:pages_per_category]:
+            urls.append(scraper.extract_listing_fields(product, base_url, config, parser)["URL"])
+    return urls
+
+def benchmark_profile(profile, urls, description_selector):
+    start = time.perf_counter()
+    driver = scraper.create_driver(profile)
+    startup = time.perf_counter() - start
+    times = []
+    try:
+        for url in urls:
+            start = time.perf_counter()
+            try:
+                scraper.render_product_page(driver, url, description_selector)
+            except scraper.TimeoutException:
+                print(f"{profile}: timeout on {url}")
+                continue
+            times.append(time.perf_counter() - start)
+    finally:
+        driver.quit()
+    return startup, times
+
+if __name__ == "__main__":
+    urls = sys.argv[1:] or cookshop_product_urls()
+    if not urls:
+        sys.exit("No product pages to render")
+    description_selector = scraper.config3['product_page']['description']
+
+    print(f"{'profile':<8} {'startup s':>10} {'pages':>6} {'mean s/page':>12} {'median s/page':>14}")
+    for profile in profiles:
+        startup, times = benchmark_profile(profile, urls, description_selector)
+        if times:
+            print(f"{profile:<8} {startup:>10.2f} {len(times):>6} {statistics.mean(times):>12.2f} {statistics.median(times):>14.2f}")
+        else:
+            print(f"{profile:<8} {startup:>10.2f} {0:>6}")
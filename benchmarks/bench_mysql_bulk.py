@@ -0,0 +1,57 @@
+# Rows/second and wall time of a full load with the three write paths of store_data_in_mysql:
+#   rows     one row per INSERT (batch size 1), like the scraper used to write
+#   batches  multi-row upserts of --batch-size rows (the default "write_mode")
+#   bulk     LOAD DATA LOCAL INFILE into a staging table and one INSERT ... SELECT ("write_mode": "bulk")
+# Every path writes into an empty table first and then once more over the same rows, which is what a re-crawl does.
+# The benchmark writes into its own tables, which are dropped after every run.
+#
+# Usage: python benchmarks/bench_mysql_bulk.py [--rows 20000] [--batch-size 200] [--html-storage inline] [--history]
+# The connection settings are taken from the MYSQL_HOST, MYSQL_USER, MYSQL_PASSWORD and MYSQL_DATABASE variables.
+# The server has to allow LOAD DATA LOCAL (SET GLOBAL local_infile = 1, or --local-infile=1 for mariadb in docker):
+#   docker run -d --name bench-mariadb -p 3306:3306 -e MARIADB_ROOT_PASSWORD=admin -e MARIADB_DATABASE=ntoulasBase mariadb:11 --local-infile=1
+import argparse
+import os
+import sys
+import time
+import mysql.connector
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import M151_EcommerseProject as scraper
+from bench_mysql_writes import db_config, generated_products
+
+table_name = "bench_bulk_product_data"
+
+def drop_tables():
+    connection = mysql.connector.connect(**db_config)
+    cursor = connection.cursor()
+    cursor.execute(f"DROP VIEW IF EXISTS {scraper.latest_history_view(table_name)}")
+    for table in (table_name, scraper.html_blob_table(table_name), scraper.history_table(table_name)):
+        cursor.execute(f"DROP TABLE IF EXISTS {table}")
+    cursor.close()
+    connection.close()
+
+def run(rows, batch_size, html_storage, history):
+    paths = {
+        "rows": dict(batch_size=1, write_mode="batches"),
+        "batches": dict(batch_size=batch_size, write_mode="batches"),
+        "bulk": dict(batch_size=batch_size, write_mode="bulk")
+    }
+    print(f"{'path':<8} {'load':<8} {'rows':>7} {'seconds':>9} {'rows/second':>12}")
+    for path, settings in paths.items():
+        drop_tables()
+        config = dict(db_config, html_storage=html_storage, history=history, **settings)
+        for load in ("insert", "update"):
+            start = time.perf_counter()
+            scraper.store_data_in_mysql(rows, table_name, config)
+            elapsed = time.perf_counter() - start
+            print(f"{path:<8} {load:<8} {len(rows):>7} {elapsed:>9.2f} {len(rows) / elapsed:>12.0f}")
+    drop_tables()
+
+if __name__ == "__main__":
+    arguments = argparse.ArgumentParser(description="Compare row, batch and LOAD DATA writes to MySQL.")
+    arguments.add_argument('--rows', type=int, default=20000)
+    arguments.add_argument('--batch-size', type=int, default=200)
+    arguments.add_argument('--html-storage', default="inline", choices=["inline", "blobs"])
+    arguments.add_argument('--history', action='store_true', help="also keep the history of prices and availability")
+    options = arguments.parse_args()
+    run(generated_products(options.rows), options.batch_size, options.html_storage, options.history)
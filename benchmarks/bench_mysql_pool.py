@@ -0,0 +1,46 @@
+# Rows/second of store_data_in_mysql with 1 writer (one connection, the old path) and with N writer threads on pooled connections.
+# The benchmark writes into its own table, which is dropped after every run.
+#
+# Usage: python benchmarks/bench_mysql_pool.py [--rows 5000] [--writers 1,2,4,8] [--batch-size 200] [--html-storage inline]
+# The connection settings are taken from the MYSQL_HOST, MYSQL_USER, MYSQL_PASSWORD and MYSQL_DATABASE variables.
+# A local server for it can be started with docker:
+#   docker run -d --name bench-mariadb -p 3306:3306 -e MARIADB_ROOT_PASSWORD=admin -e MARIADB_DATABASE=ntoulasBase mariadb:11
+import argparse
+import os
+import sys
+import time
+import mysql.connector
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import M151_EcommerseProject as scraper
+from bench_mysql_writes import db_config, generated_products
+
+table_name = "bench_pool_product_data"
+
+def drop_tables():
+    connection = mysql.connector.connect(**db_config)
+    cursor = connection.cursor()
+    for table in (table_name, scraper.html_blob_table(table_name)):
+        cursor.execute(f"DROP TABLE IF EXISTS {table}")
+    cursor.close()
+    connection.close()
+
+def run(rows, writer_counts, batch_size, html_storage):
+    print(f"{'writers':>7} {'rows':>7} {'seconds':>9} {'rows/second':>12}")
+    for writers in writer_counts:
+        drop_tables()
+        config = dict(db_config, batch_size=batch_size, html_storage=html_storage, writer_threads=writers)
+        start = time.perf_counter()
+        scraper.store_data_in_mysql(rows, table_name, config)
+        elapsed = time.perf_counter() - start
+        print(f"{writers:>7} {len(rows):>7} {elapsed:>9.2f} {len(rows) / elapsed:>12.0f}")
+    drop_tables()
+
+if __name__ == "__main__":
+    arguments = argparse.ArgumentParser(description="Compare one MySQL writer with parallel pooled writers.")
+    arguments.add_argument('--rows', type=int, default=5000)
+    arguments.add_argument('--writers', default="1,2,4,8")
+    arguments.add_argument('--batch-size', type=int, default=200)
+    arguments.add_argument('--html-storage', default="inline", choices=["inline", "blobs"])
+    options = arguments.parse_args()
+    run(generated_products(options.rows), [int(count) for count in options.writers.split(',')], options.batch_size, options.html_storage)
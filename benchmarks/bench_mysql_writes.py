@@ -0,0 +1,65 @@
+# Rows/second of store_data_in_mysql for different batch sizes, against a local MySQL/MariaDB server.
+# A batch size of 1 is the old row-at-a-time behaviour (one INSERT round trip per product).
+# The benchmark writes into its own table, which is dropped at the end.
+#
+# Usage: python benchmarks/bench_mysql_writes.py [--rows 2000] [--batch-sizes 1,50,200,1000]
+# The connection settings are taken from the MYSQL_HOST, MYSQL_USER, MYSQL_PASSWORD and MYSQL_DATABASE variables.
+import argparse
+import os
+import sys
+import time
+import pandas as pd
+import mysql.connector
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import M151_EcommerseProject as scraper
+
+table_name = "bench_product_data"
+
+db_config = {
+    "host": os.environ.get("MYSQL_HOST", "localhost"),
+    "user": os.environ.get("MYSQL_USER", "root"),
+    "password": os.environ.get("MYSQL_PASSWORD", "admin"),
+    "database": os.environ.get("MYSQL_DATABASE", "ntoulasBase")
+}
+
+# Rows that look like a real crawl: a listing snippet of a few KB and a product page of about 100 KB.
+def generated_products(count):
+    page = "<div class='block'>" + "Περιγραφή προϊόντος " * 5000 + "</div>"
+    return pd.DataFrame([{
+        "HTML": f"<div class='ty-grid-list__item'>product {number}</div>" * 40,
+        "Description": f"Description of product {number}",
+        "URL": f"https://shop.example/product-{number}",
+        "Price": f"{number},90 €",
+        "Image Info": f"https://shop.example/images/{number}.jpg",
+        "Content HTML": page,
+        "Source": "https://shop.example",
+        "Title": f"Product {number}",
+        "Availability": "Άμεσα διαθέσιμο",
+        "Product Code": f"CODE-{number}",
+        "Brand": "Brand"
+    } for number in range(count)])
+
+def run(rows, batch_sizes):
+    connection = mysql.connector.connect(**db_config)
+    cursor = connection.cursor()
+    try:
+        print(f"{'batch size':>10} {'rows':>7} {'seconds':>9} {'rows/second':>12}")
+        for batch_size in batch_sizes:
+            cursor.execute(f"DROP TABLE IF EXISTS {table_name}")
+            scraper.store_data_in_mysql(rows.head(0), table_name, db_config) # creates the empty table
+            start = time.perf_counter()
+            written = scraper.write_rows_in_batches(connection, cursor, (scraper.to_table_row(row) for row in rows.reindex(columns=scraper.product_columns).itertuples(index=False, name=None)), table_name, batch_size)
+            elapsed = time.perf_counter() - start
+            print(f"{batch_size:>10} {written:>7} {elapsed:>9.2f} {written / elapsed:>12.0f}")
+    finally:
+        cursor.execute(f"DROP TABLE IF EXISTS {table_name}")
+        cursor.close()
+        connection.close()
+
+if __name__ == "__main__":
+    arguments = argparse.ArgumentParser(description="Compare row-at-a-time and batched MySQL upserts.")
+    arguments.add_argument('--rows', type=int, default=2000)
+    arguments.add_argument('--batch-sizes', default="1,50,200,1000")
+    options = arguments.parse_args()
+    run(generated_products(options.rows), [int(size) for size in options.batch_sizes.split(',')])
@@ -0,0 +1,205 @@
+# Offline benchmark of the whole scraper. The shops are served from the saved pages of benchmarks/fixtures by the
+# local fixture server (see fixture_server.py) and the normal site configs are pointed at it, so a slowdown of
+# extract_product_info or store_data_in_mysql shows up without hitting the real shops.
+#
+# Stages that are reported:
+#   crawl     extract_product_info for every shop, end to end, which is what a real run does
+#   fetch     downloading the same listing and product pages again, without parsing them
+#   parse     building the tree of every page with the parser of the config
+#   extract   running the selectors on the trees (extract_listing_fields and extract_product_page_fields without the parse)
+#   db write  store_data_in_mysql into a scratch table. Only with --mysql, the connection is taken from the MYSQL_* variables,
+#             or with --sqlite, into a temporary SQLite file, which needs no server.
+#
+# Usage: python benchmarks/bench_offline.py [--products 100] [--per-page 24] [--latency-ms 20] [--parser html.parser] [--mysql | --sqlite]
+# With --min-products-per-second the script exits with an error if the crawl was slower, so it can be used in CI.
+# It also fails if a shop did not give all its products or some fields could not be found in the pages.
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import M151_EcommerseProject as scraper
+import fixture_server
+
+table_name = "bench_offline_product_data"
+
+# The config of every shop, as they are used in a real run.
+shop_configs = {
+    "e-druster": scraper.config1,
+    "cosmomarket": scraper.config2,
+    "cookshop": scraper.config3
+}
+
+# Fields that are always in the fixture pages. If one of them comes back as "No ...", the extraction is broken.
+# The brand is only checked for the shops whose config has a "brand" selector.
+checked_fields = ["Description", "Price", "Image Info", "Title", "Availability", "Product Code"]
+
+# (PLP url, base url, config) jobs that point at the fixture servers.
+# The pages of the fixtures have every field in the static HTML, so cookshop does not need the browser.
+# The rate limit of the real shops is lifted, otherwise it would be the only thing we measure.
+def offline_jobs(servers, parser, requests_per_second):
+    jobs = []
+    for name, server in servers.items():
+        config = dict(shop_configs[name])
+        config["render"] = "never"
+        config["requests_per_second"] = requests_per_second
+        config["burst"] = requests_per_second
+        if parser:
+            config["parser"] = parser
+        jobs.append((server.base_url + fixture_server.category_path, server.base_url, config))
+    return jobs
+
+def crawl(jobs, verbose):
+    results = []
+    for url, base_url, config in jobs:
+        start = time.perf_counter()
+        # extract_product_info prints a line for every page, which is only noise here.
+        with contextlib.redirect_stdout(sys.stdout if verbose else io.StringIO()):
+            products = scraper.extract_product_info(url, base_url, config)
+        results.append((products, time.perf_counter() - start))
+    return results
+
+# Time the stages of the crawl separately, over the same pages that the crawl went through.
+def measure_stages(servers, jobs, crawled):
+    timings = {"fetch": 0.0, "parse": 0.0, "extract": 0.0}
+    downloaded = 0
+    for (server, (url, base_url, config)), (products, _) in zip(zip(servers.values(), jobs), crawled):
+        max_concurrency = config.get('max_concurrency', scraper.default_max_concurrency)
+        parser = scraper.get_html_parser(config)
+        listing_urls = [base_url + path for path in server.shop.listing_urls()]
+        product_urls = list(products["URL"])
+
+        start = time.perf_counter()
+        listing_pages = [response.content for response in scraper.fetch_pages(listing_urls, max_concurrency)]
+        product_pages = [response.content for response in scraper.fetch_pages(product_urls, max_concurrency)]
+        timings["fetch"] += time.perf_counter() - start
+        downloaded += sum(len(page) for page in listing_pages + product_pages)
+
+        start = time.perf_counter()
+        trees = [parser.parse(scraper.decode_html(page)) for page in listing_pages]
+        parse_time = time.perf_counter() - start
+        start = time.perf_counter()
+        for tree in trees:
+            for product in parser.select(tree, config['product_list']):
+                scraper.extract_listing_fields(product, base_url, config, parser)
+        timings["extract"] += time.perf_counter() - start
+
+        # extract_product_page_fields does its own parse, so the parse of the same pages is taken away from its time.
+        start = time.perf_counter()
+        for page in product_pages:
+            parser.parse(scraper.decode_html(page))
+        product_parse_time = time.perf_counter() - start
+        start = time.perf_counter()
+        for page in product_pages:
+            scraper.extract_product_page_fields(page, config)
+        timings["extract"] += max(time.perf_counter() - start - product_parse_time, 0)
+        timings["parse"] += parse_time + product_parse_time
+    return timings, downloaded
+
+def write_to_mysql(products):
+    import mysql.connector
+    db_config = {
+        "host": os.environ.get("MYSQL_HOST", "localhost"),
+        "user": os.environ.get("MYSQL_USER", "root"),
+        "password": os.environ.get("MYSQL_PASSWORD", "admin"),
+        "database": os.environ.get("MYSQL_DATABASE", "ntoulasBase"),
+        "batch_size": 200,
+        "html_storage": "blobs",
+        "html_compression": "zlib"
+    }
+    tables = [table_name, scraper.html_blob_table(table_name)]
+    connection = mysql.connector.connect(**{key: db_config[key] for key in ("host", "user", "password", "database")})
+    cursor = connection.cursor()
+    try:
+        for table in tables:
+            cursor.execute(f"DROP TABLE IF EXISTS {table}")
+        start = time.perf_counter()
+        scraper.store_data_in_mysql(products, table_name, db_config)
+        return time.perf_counter() - start
+    finally:
+        for table in tables:
+            cursor.execute(f"DROP TABLE IF EXISTS {table}")
+        cursor.close()
+        connection.close()
+
+def write_to_sqlite(products):
+    with tempfile.TemporaryDirectory() as directory:
+        db_config = {
+            "backend": "sqlite",
+            "sqlite_path": os.path.join(directory, "bench.sqlite3"),
+            "batch_size": 200,
+            "html_storage": "blobs",
+            "html_compression": "zlib"
+        }
+        start = time.perf_counter()
+        scraper.store_data_in_mysql(products, table_name, db_config)
+        return time.perf_counter() - start
+
+# Products that are missing or have fields that were not found. An empty list means the crawl is correct.
+def check_products(servers, crawled):
+    problems = []
+    for (name, server), (products, _) in zip(servers.items(), crawled):
+        if len(products) != server.shop.products:
+            problems.append(f"{name}: {len(products)} products instead of {server.shop.products}")
+        for column in checked_fields + (["Brand"] if "brand" in shop_configs[name] else []):
+            missing = products[column].astype(str).str.startswith("No ").sum()
+            if missing:
+                problems.append(f"{name}: {missing} products without {column}")
+    return problems
+
+if __name__ == "__main__":
+    arguments = argparse.ArgumentParser(description="Benchmark the scraper against local copies of the shops.")
+    arguments.add_argument('--products', type=int, default=100, help="products in the category of every shop")
+    arguments.add_argument('--per-page', type=int, default=24, help="products per listing page, for the shops with pagination")
+    arguments.add_argument('--latency-ms', type=float, default=20, help="delay of every response of the fixture server")
+    arguments.add_argument('--requests-per-second', type=float, default=1000, help="rate limit per shop (the real default is scraper.default_requests_per_second)")
+    arguments.add_argument('--parser', help="override the \"parser\" of the configs, for example lxml or selectolax")
+    arguments.add_argument('--mysql', action='store_true', help="also time store_data_in_mysql")
+    arguments.add_argument('--sqlite', action='store_true', help="also time store_data_in_mysql with the SQLite backend")
+    arguments.add_argument('--min-products-per-second', type=float, help="fail if the crawl is slower than this")
+    arguments.add_argument('--verbose', action='store_true', help="show the output of the scraper")
+    options = arguments.parse_args()
+
+    scraper.http_cache_directory = None # every run has to hit the server
+    servers = fixture_server.start_fixture_servers(options.products, options.per_page, options.latency_ms / 1000)
+    try:
+        jobs = offline_jobs(servers, options.parser, options.requests_per_second)
+        start = time.perf_counter()
+        crawled = crawl(jobs, options.verbose)
+        crawl_time = time.perf_counter() - start
+        server_stats = {name: dict(server.stats) for name, server in servers.items()}
+        timings, downloaded = measure_stages(servers, jobs, crawled)
+    finally:
+        fixture_server.stop_fixture_servers(servers)
+
+    all_products = pd.concat([products for products, _ in crawled], ignore_index=True)
+    total = len(all_products)
+    print(f"{options.products} products per shop, {options.latency_ms:g} ms latency, parser {options.parser or 'of the configs'}")
+    print(f"{'shop':<12} {'products':>8} {'pages':>6} {'MB':>6} {'seconds':>8} {'products/s':>11}")
+    for (name, stats), (products, elapsed) in zip(server_stats.items(), crawled):
+        pages = stats.get("listing pages", 0) + stats.get("product pages", 0)
+        print(f"{name:<12} {len(products):>8} {pages:>6} {stats.get('bytes', 0) / 1e6:>6.1f} {elapsed:>8.2f} {len(products) / elapsed:>11.1f}")
+    print(f"{'all':<12} {total:>8} {'':>6} {'':>6} {crawl_time:>8.2f} {total / crawl_time:>11.1f}")
+
+    if options.mysql:
+        timings["db write"] = write_to_mysql(all_products)
+    elif options.sqlite:
+        timings["db write"] = write_to_sqlite(all_products)
+    print()
+    print(f"{'stage':<10} {'seconds':>8} {'products/s':>11}")
+    for stage, elapsed in timings.items():
+        print(f"{stage:<10} {elapsed:>8.3f} {total / elapsed if elapsed else 0:>11.1f}")
+    print(f"downloaded {downloaded / 1e6:.1f} MB in the fetch stage")
+
+    problems = check_products(servers, crawled)
+    for problem in problems:
+        print(f"ERROR: {problem}")
+    if options.min_products_per_second and total / crawl_time < options.min_products_per_second:
+        problems.append("too slow")
+        print(f"ERROR: {total / crawl_time:.1f} products/s is below the minimum of {options.min_products_per_second:g}")
+    sys.exit(1 if problems else 0)
@@ -0,0 +1,85 @@
+# Benchmark of the product page parsing in the cookshop branch of extract_product_info.
+# "before" is the old code path: the selenium page source was parsed into a soup, turned back into a string with str(soup)
+# and then parsed four more times for the title, availability, product code and brand (five parses per product).
+# "after" is extract_product_page_fields, which parses the page once and runs every selector on the same tree.
+#
+# Usage: python benchmarks/bench_parse_once.py [saved_cookshop_product_page.html ...]
+# Without arguments a cookshop-like product page is generated, so the benchmark can run without the network.
+import os
+import sys
+import time
+from bs4 import BeautifulSoup
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import M151_EcommerseProject as scraper
+
+repeats = 20
+
+# A product page with the cookshop tags, padded with menus and related products to the size of a real page.
+def generated_product_page():
+    menu = "".join(f'<li class="menu-item"><a href="/el/catalog/category-{i}">Κατηγορία {i}</a></li>' for i in range(300))
+    related = "".join(
+        f'<div class="gya-product"><a class="wrap" href="/el/product-{i}"><img src="/img/{i}.jpg"></a>'
+        f'<div class="description">Προϊόν {i}</div><div class="price">{i},90 €</div></div>'
+        for i in range(120)
+    )
+    paragraphs = "".join(f"<p>Παράγραφος περιγραφής {i} με αρκετό κείμενο για το προϊόν.</p>" for i in range(15))
+    return (
+        '<html><head><title>Cookshop</title></head><body>'
+        f'<nav><ul>{menu}</ul></nav>'
+        '<h1 class="page-title center">Αντικολλητικό τηγάνι 28cm</h1>'
+        '<div class="brand-title">Tefal</div>'
+        '<span class="avail">Άμεσα διαθέσιμο</span><span class="code">ΚΩΔ. 123456</span>'
+        f'<div class="tab active-now" id="group-0">{paragraphs}</div>'
+        f'<ul class="product-list">{related}</ul>'
+        '</body></html>'
+    )
+
+# The cookshop branch as it was: five parses of the same page.
+def extract_before(page_source, config):
+    soup = BeautifulSoup(page_source, 'html.parser')
+    description = scraper.extract_paragraphs(soup.select_one(config['product_page']['description']), "No description found")
+    product_page_html = str(soup)
+    title_tag = BeautifulSoup(product_page_html, 'html.parser').select_one(config['product_page']['title'])
+    availability_tag = BeautifulSoup(product_page_html, 'html.parser').select_one(config['product_page']['availability'])
+    product_code_tag = BeautifulSoup(product_page_html, 'html.parser').select_one(config['product_page']['product_code'])
+    brand_tag = BeautifulSoup(product_page_html, 'html.parser').select_one(config['brand'])
+    return {
+        "title": title_tag.text.strip() if title_tag else 'No title',
+        "description": description,
+        "availability": availability_tag.text.strip() if availability_tag else 'No availability info',
+        "product_code": product_code_tag.text.strip() if product_code_tag else 'No product code',
+        "brand": brand_tag.text.strip() if brand_tag else 'No brand'
+    }
+
+def extract_after(page_source, config):
+    fields, _ = scraper.extract_product_page_fields(page_source, config)
+    return fields
+
+def time_per_product(extract, pages, config):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for page in pages:
+            extract(page, config)
+    return (time.perf_counter() - start) / (repeats * len(pages))
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        pages = []
+        for path in sys.argv[1:]:
+            with open(path, encoding='utf-8') as f:
+                pages.append(f.read())
+    else:
+        pages = [generated_product_page()]
+
+    config = scraper.config3
+    # Both ways must give the same fields, otherwise the comparison means nothing.
+    for page in pages:
+        assert extract_before(page, config) == extract_after(page, config)
+
+    before = time_per_product(extract_before, pages, config)
+    after = time_per_product(extract_after, pages, config)
+    print(f"pages: {len(pages)}, average size: {sum(len(page) for page in pages) // len(pages)} characters")
+    print(f"before (5 parses): {before * 1000:.2f} ms per product")
+    print(f"after  (1 parse):  {after * 1000:.2f} ms per product")
+    print(f"speedup: {before / after:.1f}x")
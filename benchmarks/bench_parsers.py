@@ -0,0 +1,122 @@
+# Comparison of the HTML parsers that can be selected with the "parser" key of a site config.
+# For every shop it times the PLP parse + listing extraction and the PDP parse + product page extraction
+# over saved pages, and checks that every parser gives the same fields as "html.parser".
+#
+# Usage:
+#   python benchmarks/bench_parsers.py --save     download the PLP and a few PDPs of every shop into benchmarks/pages
+#   python benchmarks/bench_parsers.py            run the comparison over the saved pages
+#   python benchmarks/bench_parsers.py --pages DIR
+# Saved pages are kept as DIR/<site>/plp.html and DIR/<site>/pdp-<n>.html.
+import argparse
+import glob
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import M151_EcommerseProject as scraper
+
+default_pages_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pages')
+product_pages_per_site = 5
+repeats = 10
+
+# One (PLP url, base url, config) job for every shop. The cookshop and e-dructer categories use the same tags.
+def jobs_per_site():
+    jobs = {}
+    for url, base_url, config in scraper.site_jobs:
+        jobs.setdefault(config['site'], (url, base_url, config))
+    return jobs
+
+def save_pages(pages_dir):
+    for site, (url, base_url, config) in jobs_per_site().items():
+        os.makedirs(os.path.join(pages_dir, site), exist_ok=True)
+        response = scraper.fetch_page(url)
+        if response is None or response.status_code != 200:
+            print(f"{site}: could not download {url}")
+            continue
+        with open(os.path.join(pages_dir, site, 'plp.html'), 'wb') as f:
+            f.write(response.content)
+
+        parser = scraper.get_html_parser()
+        soup = parser.parse(scraper.decode_html(response.content))
+        products = parser.select(soup, config['product_list'])[:product_pages_per_site]
+        links = [scraper.extract_listing_fields(product, base_url, config, parser)["URL"] for product in products]
+        # The cookshop description is loaded with javascript, but the rest of the page is static and is enough for parsing.
+        for number, product_response in enumerate(scraper.fetch_pages(links), start=1):
+            if product_response is not None and product_response.status_code == 200:
+                with open(os.path.join(pages_dir, site, f'pdp-{number}.html'), 'wb') as f:
+                    f.write(product_response.content)
+        print(f"{site}: saved the PLP and {len(links)} product pages")
+
+def read_pages(paths):
+    pages = []
+    for path in paths:
+        with open(path, 'rb') as f:
+            pages.append(f.read())
+    return pages
+
+def extract_plp(page, base_url, config):
+    parser = scraper.get_html_parser(config)
+    soup = parser.parse(scraper.decode_html(page))
+    return [scraper.extract_listing_fields(product, base_url, config, parser) for product in parser.select(soup, config['product_list'])]
+
+# Fields that are compared between parsers. The "HTML" snippet is left out because every library
+# serializes markup slightly differently (for example <img ...> against <img .../>), and so is the "Listing Hash" that is made from it.
+def comparable_fields(fields):
+    if isinstance(fields, list):
+        return [comparable_fields(product) for product in fields]
+    return {key: value for key, value in fields.items() if key not in ("HTML", "Listing Hash")}
+
+def extract_pdp(page, base_url, config):
+    fields, _ = scraper.extract_product_page_fields(page, config)
+    return fields
+
+def time_extraction(extract, pages, base_url, config):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for page in pages:
+            extract(page, base_url, config)
+    return (time.perf_counter() - start) / (repeats * len(pages))
+
+def available_parsers():
+    parsers = []
+    for name in scraper.html_parser_factories:
+        try:
+            scraper.get_html_parser({"parser": name})
+            parsers.append(name)
+        except ImportError:
+            print(f"{name}: not installed, skipped")
+    return parsers
+
+def compare(pages_dir):
+    parsers = available_parsers()
+    print(f"{'site':<12} {'page':<4} {'parser':<12} {'ms/page':>9} {'speedup':>8} {'same fields':>12}")
+    for site, (url, base_url, config) in jobs_per_site().items():
+        plp_paths = glob.glob(os.path.join(pages_dir, site, 'plp.html'))
+        pdp_paths = sorted(glob.glob(os.path.join(pages_dir, site, 'pdp-*.html')))
+        for kind, extract, paths in (("PLP", extract_plp, plp_paths), ("PDP", extract_pdp, pdp_paths)):
+            if not paths:
+                continue
+            pages = read_pages(paths)
+            baseline_time = None
+            baseline_fields = None
+            for name in parsers:
+                site_config = dict(config, parser=name)
+                fields = [comparable_fields(extract(page, base_url, site_config)) for page in pages]
+                elapsed = time_extraction(extract, pages, base_url, site_config)
+                if baseline_time is None:
+                    baseline_time, baseline_fields = elapsed, fields
+                print(f"{site:<12} {kind:<4} {name:<12} {elapsed * 1000:>9.2f} {baseline_time / elapsed:>7.1f}x {str(fields == baseline_fields):>12}")
+
+if __name__ == "__main__":
+    arguments = argparse.ArgumentParser(description="Compare the HTML parsers over saved shop pages.")
+    arguments.add_argument('--pages', default=default_pages_dir, help="directory with the saved pages")
+    arguments.add_argument('--save', action='store_true', help="download the pages of the configured shops first")
+    options = arguments.parse_args()
+
+    if options.save:
+        save_pages(options.pages)
+    if not glob.glob(os.path.join(options.pages, '*', '*.html')):
+        print(f"No saved pages in {options.pages}, run with --save first")
+    else:
+        compare(options.pages)
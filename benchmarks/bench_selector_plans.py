@@ -0,0 +1,59 @@
+# Extraction cost per product with the compiled selector plans of the site configs, against the same extraction with
+# selector strings (parsed by soupsieve at every call, which is how the scraper used to run them).
+# The pages are made from benchmarks/fixtures without a server and parsed once, so only the extraction is timed:
+#   listing  extract_listing_fields on every product block of the category page
+#   product  the product page fields of the plan on every product page
+#
+# Usage: python benchmarks/bench_selector_plans.py [--products 200] [--repeat 5] [--parser html.parser]
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import M151_EcommerseProject as scraper
+import fixture_server
+from bench_offline import shop_configs
+
+# A parser that does not compile, so the plan keeps the selector strings.
+class UncompiledParser(scraper.SoupParser):
+    def compile(self, selector):
+        return selector
+
+def parsed_pages(name, products, parser):
+    shop = fixture_server.FixtureShop(name, products, products)
+    listing = parser.parse(shop.listing_page(1))
+    product_pages = [parser.parse(shop.product_page(product_id)) for product_id in range(products)]
+    return listing, product_pages
+
+def time_extraction(config, parser, listing, product_pages, repeat):
+    plan = scraper.get_selector_plan(config, parser)
+    blocks = parser.select(listing, plan.product_list)
+    best = {"listing": float('inf'), "product": float('inf')}
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for block in blocks:
+            scraper.extract_listing_fields(block, "http://127.0.0.1", config, parser)
+        best["listing"] = min(best["listing"], (time.perf_counter() - start) / len(blocks))
+        start = time.perf_counter()
+        for page in product_pages:
+            plan.product_page_fields(page)
+        best["product"] = min(best["product"], (time.perf_counter() - start) / len(product_pages))
+    return best
+
+if __name__ == "__main__":
+    arguments = argparse.ArgumentParser(description="Extraction cost per product with compiled and uncompiled selectors.")
+    arguments.add_argument('--products', type=int, default=200)
+    arguments.add_argument('--repeat', type=int, default=5, help="the best of this many runs is reported")
+    arguments.add_argument('--parser', default="html.parser", choices=["html.parser", "lxml"])
+    options = arguments.parse_args()
+
+    compiled_parser = scraper.get_html_parser({"parser": options.parser})
+    uncompiled_parser = UncompiledParser(options.parser)
+    print(f"{'shop':<12} {'stage':<8} {'strings us':>11} {'compiled us':>12} {'speedup':>8}")
+    for name, config in shop_configs.items():
+        listing, product_pages = parsed_pages(name, options.products, compiled_parser)
+        uncompiled = time_extraction(config, uncompiled_parser, listing, product_pages, options.repeat)
+        compiled = time_extraction(config, compiled_parser, listing, product_pages, options.repeat)
+        for stage in ("listing", "product"):
+            print(f"{name:<12} {stage:<8} {uncompiled[stage] * 1e6:>11.1f} {compiled[stage] * 1e6:>12.1f} {uncompiled[stage] / compiled[stage]:>7.2f}x")
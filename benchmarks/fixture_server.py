@@ -0,0 +1,160 @@
+# A local HTTP server that plays the shops from the saved pages in benchmarks/fixtures, so the scraper can be run without the network.
+# Every shop has a folder (named after the "site" of its config) with the templates of its pages:
+#   plp.html            the category page, with {{products}}, {{pagination}} and {{menu}} in it
+#   plp_item.html       one product of the category, with {{id}} and {{price}}
+#   pdp.html            a product page, with {{id}}, {{price}} and {{menu}}
+#   plp_page_link.html  (optional) a link of the pagination bar, with {{url}} and {{page}}. Without it the whole category is on one page.
+# From these the server builds a category of any size: product N gets the id N and a price made from N.
+# Every shop is served on its own port, so each one is a different host for the per-host sessions and limits of the scraper.
+#
+# Usage: python benchmarks/fixture_server.py [--products 100] [--per-page 24] [--latency-ms 20]
+import argparse
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+fixtures_directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+shops = ["e-druster", "cosmomarket", "cookshop"]
+
+category_path = "/catalog/category"
+product_path = "/product/"
+menu_links = 150 # Links of the category menu that every page has, so the pages are about as heavy as the real ones.
+
+# Fill the {{name}} placeholders of a template.
+def fill(template, values):
+    for name, value in values.items():
+        template = template.replace("{{" + name + "}}", str(value))
+    return template
+
+def product_price(product_id):
+    cents = 10 + (product_id * 737) % 99000
+    return f"{cents // 100},{cents % 100:02d}"
+
+class FixtureShop:
+    def __init__(self, name, products, per_page):
+        self.name = name
+        self.products = products
+        self.templates = {}
+        for template in ("plp", "plp_item", "pdp", "plp_page_link"):
+            path = os.path.join(fixtures_directory, name, template + ".html")
+            if os.path.exists(path):
+                with open(path, encoding='utf-8') as f:
+                    self.templates[template] = f.read()
+        # A shop without a pagination template shows the whole category on one page.
+        self.per_page = per_page if "plp_page_link" in self.templates else products
+        self.page_count = max(1, -(-products // self.per_page))
+        self.menu = "".join(f'<li><a href="/catalog/category-{number}">Κατηγορία {number}</a></li>' for number in range(menu_links))
+
+    def listing_url(self, page):
+        return category_path if page == 1 else f"{category_path}?page={page}"
+
+    def listing_urls(self):
+        return [self.listing_url(page) for page in range(1, self.page_count + 1)]
+
+    def product_url(self, product_id):
+        return f"{product_path}{product_id}"
+
+    def listing_page(self, page):
+        first = (page - 1) * self.per_page
+        items = "".join(fill(self.templates["plp_item"], {"id": product_id, "price": product_price(product_id)})
+                        for product_id in range(first, min(first + self.per_page, self.products)))
+        pagination = "".join(fill(self.templates["plp_page_link"], {"url": self.listing_url(number), "page": number})
+                             for number in range(1, self.page_count + 1)) if self.page_count > 1 else ""
+        return fill(self.templates["plp"], {"products": items, "pagination": pagination, "menu": self.menu})
+
+    def product_page(self, product_id):
+        return fill(self.templates["pdp"], {"id": product_id, "price": product_price(product_id), "menu": self.menu})
+
+# The product links of the templates end with the id of the product, for example /el/product/tigani-antikollitiko-12
+# or /p/12/Ilektriki_Skoupa_12.html. Every path that is not the category is answered with the product page of that id.
+def product_id_from_path(path):
+    digits = ""
+    for character in reversed(path.rstrip('/').rsplit('/', 1)[-1].split('.')[0]):
+        if not character.isdigit():
+            break
+        digits = character + digits
+    return int(digits) if digits else None
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1" # keep-alive, like the real shops
+
+    def do_GET(self):
+        shop = self.server.shop
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        parts = urlsplit(self.path)
+        body = None
+        if parts.path == category_path:
+            page = int(parse_qs(parts.query).get('page', ['1'])[0])
+            if 1 <= page <= shop.page_count:
+                body = shop.listing_page(page)
+                self.server.count("listing pages")
+        else:
+            product_id = product_id_from_path(parts.path)
+            if product_id is not None and product_id < shop.products:
+                body = shop.product_page(product_id)
+                self.server.count("product pages")
+
+        if body is None:
+            self.server.count("not found")
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        data = body.encode('utf-8')
+        self.server.count("bytes", len(data))
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass # one line per request would be the slowest part of the benchmark
+
+class FixtureServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, shop, latency):
+        super().__init__(("127.0.0.1", 0), FixtureHandler)
+        self.shop = shop
+        self.latency = latency
+        self.stats = {}
+        self.stats_lock = threading.Lock()
+        self.base_url = f"http://127.0.0.1:{self.server_address[1]}"
+
+    def count(self, name, amount=1):
+        with self.stats_lock:
+            self.stats[name] = self.stats.get(name, 0) + amount
+
+# Start one server per shop in background threads. Returns {shop name: server}; stop them with stop_fixture_servers.
+def start_fixture_servers(products, per_page=24, latency=0.0, names=shops):
+    servers = {}
+    for name in names:
+        server = FixtureServer(FixtureShop(name, products, per_page), latency)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers[name] = server
+    return servers
+
+def stop_fixture_servers(servers):
+    for server in servers.values():
+        server.shutdown()
+        server.server_close()
+
+if __name__ == "__main__":
+    arguments = argparse.ArgumentParser(description="Serve the saved shop pages on local ports.")
+    arguments.add_argument('--products', type=int, default=100, help="products in the category of every shop")
+    arguments.add_argument('--per-page', type=int, default=24, help="products per listing page, for the shops with pagination")
+    arguments.add_argument('--latency-ms', type=float, default=20, help="delay added to every response")
+    options = arguments.parse_args()
+
+    servers = start_fixture_servers(options.products, options.per_page, options.latency_ms / 1000)
+    for name, server in servers.items():
+        print(f"{name}: {server.base_url}{category_path}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        stop_fixture_servers(servers)